@@ -1,73 +1,276 @@
 import random
-from UtilsPosition import find_empty_row
-from Position import Position
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Value
+from BitboardPosition import BitboardPosition
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from Solver import Solver
+from BoardSpec import BoardSpec
+from SearchStats import SearchStats, RootMoveTimer
+from MoveOrdering import MoveOrdering
 
 # --------------------------------------------------
 #  Negamax Algorithm for Move Evaluation
 # --------------------------------------------------
 
-def negamax(position, alpha, beta, depth, transposition_table=None):
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when its deadline has passed. The position being searched is left in an
+    intermediate state and must be discarded.
+    """
+
+
+class SearchStop:
+    """
+    Deadline of a search passing when stop() is called instead of at a given time, for the searches running in the
+    background.
+    """
+
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        """
+        Makes the searches using this deadline raise SearchTimeout at their next node.
+        """
+        self.stopped = True
+
+
+def deadline_passed(deadline):
+    """
+    Checks the deadline of a search.
+    Parameters:
+    - deadline: time.perf_counter() value or SearchStop.
+    Returns: Boolean, True when the time is over or the search was stopped.
+    """
+    if isinstance(deadline, SearchStop):
+        return deadline.stopped
+    return time.perf_counter() > deadline
+
+
+def probe_table(transposition_table, position_key, alpha, beta, depth, stats=None):
+    """
+    Looks up a position in the transposition table and narrows the search window with the stored bound.
+    Parameters:
+    - transposition_table: TranspositionTable used by the search.
+    - position_key: Key of the position.
+    - alpha: Alpha value of the search window.
+    - beta: Beta value of the search window.
+    - depth: Depth of the search about to be run.
+    - stats: Optional SearchStats counting the probes, hits and cutoffs.
+    Returns:
+    - A tuple (score, alpha, beta, best_move) where score is the stored score if it can be returned directly
+      (None otherwise), alpha and beta the narrowed window and best_move the stored best move (or None).
+    """
+    entry = transposition_table.probe(position_key)
+    if stats is not None:
+        stats.tt_probes += 1
+    if entry is None:
+        return None, alpha, beta, None
+    if stats is not None:
+        stats.tt_hits += 1
+    entry_depth, score, flag, best_move = entry
+    if entry_depth >= depth:
+        if flag == EXACT:
+            if stats is not None:
+                stats.tt_cutoffs += 1
+            return score, alpha, beta, best_move
+        elif flag == LOWER:
+            alpha = max(alpha, score)
+        elif flag == UPPER:
+            beta = min(beta, score)
+        if alpha >= beta:
+            if stats is not None:
+                stats.tt_cutoffs += 1
+            return score, alpha, beta, best_move
+    return None, alpha, beta, best_move
+
+
+def store_result(transposition_table, position_key, alpha, beta, depth, score, best_move, stats=None):
+    """
+    Stores the result of a search in the transposition table with the kind of bound it represents.
+    Parameters:
+    - transposition_table: TranspositionTable used by the search.
+    - position_key: Key of the position.
+    - alpha: Alpha value the search was started with.
+    - beta: Beta value the search was started with.
+    - depth: Depth of the search.
+    - score: Score returned by the search.
+    - best_move: Best column found by the search.
+    - stats: Optional SearchStats counting the stores.
+    """
+    if stats is not None:
+        stats.tt_stores += 1
+    if score <= alpha:
+        flag = UPPER
+    elif score >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    transposition_table.store(position_key, depth, score, flag, best_move)
+
+
+def negamax(position, alpha, beta, depth, transposition_table=None, stats=None, ordering=None):
     """
     Performs the Negamax search algorithm recursively to find the best move, optimized with alpha-beta pruning.
     Parameters:
-    - position: An instance of Position class representing the current game state.
+    - position: An instance of Position or BitboardPosition representing the current game state.
     - alpha: Alpha value for alpha-beta pruning, representing the minimum score that the maximizing player .
     - beta: Beta value for alpha-beta pruning, representing the maximum score that the minimizing player.
     - depth: The current depth in the search tree.
-    - transposition_table: An optional dictionary to store previously calculated scores of positions to avoid redundant calculations.
+    - transposition_table: An optional TranspositionTable to store previously calculated scores of positions to avoid redundant calculations.
+    - stats: Optional SearchStats collecting the nodes, transposition table use and cutoffs of the search.
+    - ordering: Optional MoveOrdering with the killer moves and history scores of the search.
     Returns:
-    - The best score that can be achieved from the current position given optimal play.
+    - The best score that can be achieved from the current position given optimal play. When it is not
+      above alpha it is an upper bound of the real score, when it is not below beta a lower bound.
     """
     if transposition_table is None:
-        transposition_table = {}
+        transposition_table = TranspositionTable()
+    if ordering is None:
+        ordering = MoveOrdering(position.spec)
+    if stats is not None:
+        stats.nodes += 1
 
     # Early termination if the position is a terminal state or the depth limit is reached
     if position.is_terminal() or depth == 0:
         return position.evaluate() if position.current_player == 'R' else -position.evaluate()
 
-    # Retrieve the score from transposition table if already evaluated
-    position_key = tuple(map(tuple, position.grid))
-    if position_key in transposition_table:
-        return transposition_table[position_key]
-
-    valid_moves = position.generate_moves()
-    # Sort moves based on heuristics for better pruning
-    valid_moves.sort(key=lambda col: -position.evaluate_position(find_empty_row(position.grid, col), col))
+    # Forced moves: an immediate win ends the search, and only the moves that do not let the opponent
+    # win on the next move are explored (the only block when the opponent threatens to win)
+    if position.winning_moves():
+        return 1000
+    moves = position.non_losing_moves()
+    if not moves:
+        return -1000  # Double threat, or every move lets the opponent win
+
+    # Retrieve the score from transposition table if already evaluated deep enough. A position and its
+    # mirror image share their entry, the best move is stored for the position the key was computed for
+    position_key, mirrored = position.canonical_key()
+    alpha_start, beta_start = alpha, beta
+    score, alpha, beta, best_move = probe_table(transposition_table, position_key, alpha, beta, depth, stats)
+    if score is not None:
+        return score
+    if mirrored:
+        best_move = position.mirror_move(best_move)
 
-    for move in valid_moves:
+    best_score = float('-inf')
+    for index, move in enumerate(ordering.order(position, best_move, moves)):
         child = position.play(move)
-        score = -negamax(child, -beta, -alpha, depth - 1, transposition_table)
+        score = -negamax(child, -beta, -alpha, depth - 1, transposition_table, stats, ordering)
 
         # Update alpha if a better move has been found
+        if score > best_score:
+            best_score = score
+            best_move = move
         alpha = max(alpha, score)
         # Beta cutoff
-        if score >= beta:
-            return beta
+        if alpha >= beta:
+            ordering.record_cutoff(position, move, depth)
+            if stats is not None:
+                stats.record_cutoff(index)
+            break
+
+    if mirrored:
+        best_move = position.mirror_move(best_move)
+    store_result(transposition_table, position_key, alpha_start, beta_start, depth, best_score, best_move, stats)
+    return best_score
+
+
+def negamax_inplace(position, alpha, beta, depth, transposition_table=None, deadline=None, stats=None,
+                    ordering=None):
+    """
+    Same search as negamax, but the children are explored by playing and taking back moves on a single
+    position (push/pop) instead of creating a new position for every child.
+    Parameters:
+    - position: An instance of Position or BitboardPosition, modified during the search and restored on return.
+    - alpha: Alpha value for alpha-beta pruning.
+    - beta: Beta value for alpha-beta pruning.
+    - depth: The current depth in the search tree.
+    - transposition_table: An optional TranspositionTable to store previously calculated scores of positions.
+    - deadline: Optional time.perf_counter() value after which SearchTimeout is raised, or a SearchStop.
+    - stats: Optional SearchStats collecting the nodes, transposition table use and cutoffs of the search.
+    - ordering: Optional MoveOrdering with the killer moves and history scores of the search.
+    Returns:
+    - The best score that can be achieved from the current position given optimal play, or a bound as in negamax.
+    """
+    if transposition_table is None:
+        transposition_table = TranspositionTable()
+    if ordering is None:
+        ordering = MoveOrdering(position.spec)
+
+    if deadline is not None and deadline_passed(deadline):
+        raise SearchTimeout()
+    if stats is not None:
+        stats.nodes += 1
+
+    if position.is_terminal() or depth == 0:
+        return position.evaluate() if position.current_player == 'R' else -position.evaluate()
+
+    if position.winning_moves():
+        return 1000
+    moves = position.non_losing_moves()
+    if not moves:
+        return -1000
+
+    position_key, mirrored = position.canonical_key()
+    alpha_start, beta_start = alpha, beta
+    score, alpha, beta, best_move = probe_table(transposition_table, position_key, alpha, beta, depth, stats)
+    if score is not None:
+        return score
+    if mirrored:
+        best_move = position.mirror_move(best_move)
 
-    transposition_table[position_key] = alpha
-    return alpha
+    best_score = float('-inf')
+    for index, move in enumerate(ordering.order(position, best_move, moves)):
+        position.push(move)
+        score = -negamax_inplace(position, -beta, -alpha, depth - 1, transposition_table, deadline, stats, ordering)
+        position.pop()
+
+        if score > best_score:
+            best_score = score
+            best_move = move
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            ordering.record_cutoff(position, move, depth)
+            if stats is not None:
+                stats.record_cutoff(index)
+            break
+
+    if mirrored:
+        best_move = position.mirror_move(best_move)
+    store_result(transposition_table, position_key, alpha_start, beta_start, depth, best_score, best_move, stats)
+    return best_score
 
 # ---------------------------------------------
 # Managinng difficulty level 
 # ---------------------------------------------
 
-# -----
-# Easy Difficulty AI Move Decision
-# -----
-def easy_ai_move(player, grid, transposition_table=None):
+# Depth of the search below each root move, by difficulty level
+DIFFICULTY_DEPTHS = {'easy': 3, 'medium': 5, 'hard': 8}
+
+
+def search_root(player, grid, depth, columns, transposition_table=None, evaluator='classic', randomness=0.0,
+                stats=None, spec=None):
     """
-    AI move calculation for 'easy' difficulty using a simple heuristic.
+    Searches every playable column in the given order and returns the best one. Shared by all difficulty levels.
     Parameters:
     - player: Character representing the AI player.
-    - grid: 2D list representing the game board.
-    - transposition_table: Dictionary for storing game state evaluations, optional.
+    - grid: 2D list representing the game board, left unchanged.
+    - depth: Depth of the search below each root move.
+    - columns: Columns to try, in order. Earlier columns win ties unless randomness is set.
+    - transposition_table: Optional TranspositionTable to store already evaluated game states.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - randomness: Probability of switching to a later column with the same score as the best one.
+    - stats: Optional SearchStats collecting the search statistics.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
     Returns:
     - Integer representing the column index of the chosen move or -2 if no moves are available.
     """
     if transposition_table is None:
-        transposition_table = {}
+        transposition_table = TranspositionTable()
 
-    valid_columns = [col for col in range(len(grid[0])) if grid[0][col] == ' ']
+    valid_columns = [col for col in columns if grid[0][col] == ' ']
     if not valid_columns:
         return -2  # No valid moves
 
@@ -76,26 +279,20 @@ def easy_ai_move(player, grid, transposition_table=None):
     alpha = float('-inf')
     beta = float('inf')
 
+    position = BitboardPosition.from_grid(grid, player, evaluator, spec)
+    ordering = MoveOrdering(position.spec)
     for col in valid_columns:
-        row_insert = find_empty_row(grid, col)
-        grid[row_insert][col] = player  # Make the move
-
-        position_key = tuple(map(tuple, grid))  # Generate a unique key for the current grid state
-
-        if position_key in transposition_table:
-            score = transposition_table[position_key]
-        else:
-            position = Position(grid, 'R' if player == 'J' else 'J')
-            score = -negamax(position, -beta, -alpha, depth=3, transposition_table=transposition_table)
-            transposition_table[position_key] = score  # Store the score in transposition table
-
-        grid[row_insert][col] = ' '  # Undo the move
+        timer = RootMoveTimer(stats)
+        position.push(col)  # Make the move
+        score = -negamax_inplace(position, -beta, -alpha, depth, transposition_table, stats=stats, ordering=ordering)
+        position.pop()  # Undo the move
+        timer.stop(col, depth, score)
 
         if score > best_score:
             best_score = score
             best_move = col
         elif score == best_score:
-            if random.random() < 0.08:  # Introduce randomness
+            if randomness and random.random() < randomness:  # Introduce randomness
                 best_move = col
 
         alpha = max(alpha, score)
@@ -105,107 +302,421 @@ def easy_ai_move(player, grid, transposition_table=None):
 
     return best_move
 
-
 # -----
-# Medium Difficulty AI Move Decision
+# Root-parallel search: the root moves are searched by several processes
 # -----
 
-def medium_ai_move(player, grid, transposition_table=None):
+# Best root score found so far, shared by the worker processes of parallel_ai_move
+_shared_alpha = None
+
+
+def _init_root_worker(shared_alpha):
     """
-    Calculates the AI's move at a medium difficulty level using the Minimax algorithm.
+    Stores the shared best score in a worker process of parallel_ai_move.
+    Parameters:
+    - shared_alpha: multiprocessing.Value holding the best root score found so far.
+    """
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+
+
+def _search_root_move(player, grid, col, depth, evaluator, collect_stats=False, spec=None):
+    """
+    Searches one root move in a worker process of parallel_ai_move.
     Parameters:
     - player: Character representing the AI player.
     - grid: 2D list representing the game board.
-    - transposition_table: Optional dictionary to store already evaluated game states for efficiency.
+    - col: Root move to search.
+    - depth: Depth of the search below the root move.
+    - evaluator: Heuristic used at the leaves of the search.
+    - collect_stats: Whether to collect the statistics of the search.
+    - spec: BoardSpec of the board.
     Returns:
-    - Integer representing the column index for the AI's move or -2 if no valid moves are available.
+    - A tuple (col, score, stats). The score is exact when it reaches the best score found so far, stats is a
+      SearchStats for the move or None.
+    """
+    stats = SearchStats() if collect_stats else None
+    timer = RootMoveTimer(stats)
+    position = BitboardPosition.from_grid(grid, player, evaluator, spec)
+    position.push(col)
+    # Scores are integers: searching just below the best score still gives the exact score of an equal move,
+    # so ties are broken by the column order as in the serial search
+    alpha = _shared_alpha.value - 1
+    score = -negamax_inplace(position, float('-inf'), -alpha, depth, TranspositionTable(), stats=stats,
+                             ordering=MoveOrdering(position.spec))
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    timer.stop(col, depth, score)
+    return col, score, stats
+
+
+class RootSearchPool:
+    """
+    Processes of parallel_ai_move kept between searches, so a game starts them once instead of at every move.
     """
-    if transposition_table is None:
-        transposition_table = {}
 
-    valid_columns = [col for col in range(len(grid[0])) if grid[0][col] == ' ']
-    if not valid_columns:
-        return -2  # Indicates a tie or no valid moves available
+    def __init__(self, workers=None):
+        """
+        Starts the pool.
+        Parameters:
+        - workers: Number of processes, the number of CPU cores if not given.
+        """
+        self.shared_alpha = Value('d', float('-inf'))
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_root_worker,
+                                            initargs=(self.shared_alpha,))
 
-    best_score = float('-inf')
-    best_move = -1
-    alpha = float('-inf')
-    beta = float('inf')
+    def close(self):
+        """
+        Shuts the processes down.
+        """
+        self.executor.shutdown(cancel_futures=True)
 
-    for col in valid_columns:
-        row_insert = find_empty_row(grid, col)
-        grid[row_insert][col] = player  # Make the move
+    def __enter__(self):
+        return self
 
-        position_key = tuple(map(tuple, grid))  # Generate a unique key for the current grid state
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-        if position_key in transposition_table:
-            score = transposition_table[position_key]
-        else:
-            position = Position(grid, 'R' if player == 'J' else 'J')
-            score = -negamax(position, -beta, -alpha, depth=5, transposition_table=transposition_table)
-            transposition_table[position_key] = score  # Store the score
 
-        grid[row_insert][col] = ' '  # Undo the move
+def parallel_ai_move(player, grid, depth, columns, workers=None, evaluator='classic', stats=None, spec=None,
+                     pool=None):
+    """
+    Searches the root moves in parallel processes and returns the same move as search_root at the same depth.
+    Each worker starts from the best root score already found by the others, which narrows its search window.
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - depth: Depth of the search below each root move.
+    - columns: Columns to try, in order. Earlier columns win ties.
+    - workers: Number of processes, the number of CPU cores if not given.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - stats: Optional SearchStats receiving the statistics of all the workers.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - pool: Optional RootSearchPool of the processes, kept between the moves; a pool of workers processes is
+      started for this move if not given.
+    Returns:
+    - Integer representing the column index of the chosen move or -2 if no moves are available.
+    """
+    valid_columns = [col for col in columns if grid[0][col] == ' ']
+    if not valid_columns:
+        return -2  # No valid moves
+    if pool is None:
+        with RootSearchPool(workers) as pool:
+            return parallel_ai_move(player, grid, depth, columns, workers, evaluator, stats, spec, pool)
+
+    pool.shared_alpha.value = float('-inf')
+    scores = {}
+    futures = [pool.executor.submit(_search_root_move, player, grid, col, depth, evaluator, stats is not None, spec)
+               for col in valid_columns]
+    for future in as_completed(futures):
+        col, score, move_stats = future.result()
+        scores[col] = score
+        if move_stats is not None:
+            stats.merge(move_stats)
+
+    # First column in the search order among the best scores
+    best_score = max(scores.values())
+    return next(col for col in valid_columns if scores[col] == best_score)
 
-        if score > best_score:
-            best_score = score
-            best_move = col
+# -----
+# Easy Difficulty AI Move Decision
+# -----
+def easy_ai_move(player, grid, transposition_table=None, evaluator='classic', stats=None, spec=None):
+    """
+    AI move calculation for 'easy' difficulty using a simple heuristic.
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - transposition_table: TranspositionTable for storing game state evaluations, optional.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - stats: Optional SearchStats collecting the search statistics.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    Returns:
+    - Integer representing the column index of the chosen move or -2 if no moves are available.
+    """
+    return search_root(player, grid, DIFFICULTY_DEPTHS['easy'], range(len(grid[0])), transposition_table, evaluator,
+                       randomness=0.08, stats=stats, spec=spec)
 
-        alpha = max(alpha, score)
 
-        if alpha >= beta:
-            break
+# -----
+# Medium Difficulty AI Move Decision
+# -----
 
-    return best_move
+def medium_ai_move(player, grid, transposition_table=None, evaluator='classic', workers=1, stats=None,
+                   spec=None, pool=None):
+    """
+    Calculates the AI's move at a medium difficulty level using the Minimax algorithm.
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - transposition_table: Optional TranspositionTable to store already evaluated game states for efficiency.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - workers: Number of processes searching the root moves (the transposition table is not used when above 1).
+    - stats: Optional SearchStats collecting the search statistics.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - pool: Optional RootSearchPool searching the root moves when workers is above 1.
+    Returns:
+    - Integer representing the column index for the AI's move or -2 if no valid moves are available.
+    """
+    if workers > 1:
+        return parallel_ai_move(player, grid, DIFFICULTY_DEPTHS['medium'], range(len(grid[0])), workers, evaluator,
+                                stats, spec, pool)
+    return search_root(player, grid, DIFFICULTY_DEPTHS['medium'], range(len(grid[0])), transposition_table, evaluator,
+                       stats=stats, spec=spec)
 
 
 # -----
 # Hard Difficulty AI Move Decision
 # -----
 
-def hard_ai_move(player, grid, transposition_table=None):
+def hard_ai_move(player, grid, transposition_table=None, evaluator='classic', workers=1, stats=None,
+                 spec=None, pool=None):
     """
     Determines the AI's move at a hard difficulty level using a deep Minimax algorithm.
     Parameters:
     - player: Character representing the AI player.
     - grid: 2D list representing the game board.
-    - transposition_table: Optional dictionary to store already evaluated game states for efficiency.
+    - transposition_table: Optional TranspositionTable to store already evaluated game states for efficiency.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - workers: Number of processes searching the root moves (the transposition table is not used when above 1).
+    - stats: Optional SearchStats collecting the search statistics.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - pool: Optional RootSearchPool searching the root moves when workers is above 1.
     Returns:
     - Integer representing the column index for the AI's move or -2 if no valid moves are available.
     """
-    if transposition_table is None:
-        transposition_table = {}
+    if spec is None:
+        spec = BoardSpec.for_grid(grid)
+    center_cols = spec.center_order
+    if workers > 1:
+        return parallel_ai_move(player, grid, DIFFICULTY_DEPTHS['hard'], center_cols, workers, evaluator, stats, spec,
+                                pool)
+    return search_root(player, grid, DIFFICULTY_DEPTHS['hard'], center_cols, transposition_table, evaluator,
+                       stats=stats, spec=spec)
 
-    best_score = float('-inf')
-    best_move = -1
-    alpha = float('-inf')
-    beta = float('inf')
 
-    center_cols = [3, 2, 4, 1, 5, 0, 6]
-    ordered_moves = [col for col in center_cols if grid[0][col] == ' ']
+# -----
+# Fixed-depth AI Move Decision
+# -----
 
-    for col in ordered_moves:
-        row_insert = find_empty_row(grid, col)
-        grid[row_insert][col] = player  # Make the move
+def fixed_depth_ai_move(player, grid, depth, transposition_table=None, evaluator='classic', workers=1, stats=None,
+                        spec=None, pool=None):
+    """
+    Determines the AI's move with a search of a given depth, the center columns first as for the hard level.
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - depth: Depth of the search below each root move.
+    - transposition_table: Optional TranspositionTable to store already evaluated game states for efficiency.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - workers: Number of processes searching the root moves (the transposition table is not used when above 1).
+    - stats: Optional SearchStats collecting the search statistics.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - pool: Optional RootSearchPool searching the root moves when workers is above 1.
+    Returns:
+    - Integer representing the column index for the AI's move or -2 if no valid moves are available.
+    """
+    if spec is None:
+        spec = BoardSpec.for_grid(grid)
+    center_cols = spec.center_order
+    if workers > 1:
+        return parallel_ai_move(player, grid, depth, center_cols, workers, evaluator, stats, spec, pool)
+    return search_root(player, grid, depth, center_cols, transposition_table, evaluator, stats=stats, spec=spec)
 
-        position_key = tuple(map(tuple, grid))  # Generate a unique key for the current grid state
 
-        if position_key in transposition_table:
-            score = transposition_table[position_key]
-        else:
-            position = Position(grid, 'R' if player == 'J' else 'J')
-            score = -negamax(position, -beta, -alpha, depth=8, transposition_table=transposition_table)
-            transposition_table[position_key] = score  # Store the score
+# -----
+# Perfect Difficulty AI Move Decision
+# -----
 
-        grid[row_insert][col] = ' '  # Undo the move
+def perfect_ai_move(player, grid, solver=None, stats=None, spec=None):
+    """
+    Determines the AI's move with perfect play: every move is solved exactly with the solver and the
+    opening book, and a move with the best outcome is chosen (the fastest win or the slowest loss).
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - solver: Optional Solver, to keep its transposition table between moves.
+    - stats: Optional SearchStats receiving the nodes and time of the solver.
+    - spec: BoardSpec of the board, used when no solver is given. A four-in-a-row board of the grid dimensions
+      if not given either.
+    Returns:
+    - Integer representing the column index for the AI's move or -2 if no valid moves are available.
+    """
+    if solver is None:
+        solver = Solver(spec=spec if spec is not None else BoardSpec.for_grid(grid))
+    nodes = solver.nodes
+    start = time.perf_counter()
+    best_move = solver.best_move(BitboardPosition.from_grid(grid, player, spec=solver.spec))
+    if stats is not None:
+        stats.nodes += solver.nodes - nodes
+        stats.seconds += time.perf_counter() - start
+    return best_move
 
-        if score > best_score:
-            best_score = score
-            best_move = col
 
-        alpha = max(alpha, score)
+# -----
+# Time-bounded AI Move Decision
+# -----
 
-        if alpha >= beta:
+def iterative_deepening_ai_move(player, grid, time_ms=1000, max_depth=42, transposition_table=None,
+                                evaluator='classic', stats=None, spec=None):
+    """
+    Searches deeper and deeper until the time budget is spent and returns the best move of the deepest search.
+    Each iteration tries the best move of the previous one first, and the transposition table kept between
+    iterations provides the best moves of the inner positions.
+    Parameters:
+    - player: Character representing the AI player.
+    - grid: 2D list representing the game board.
+    - time_ms: Time budget for the move in milliseconds.
+    - max_depth: Maximum depth of the search below each root move.
+    - transposition_table: Optional TranspositionTable shared by the iterations.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - stats: Optional SearchStats collecting the search statistics, with one root move entry per move and depth.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    Returns:
+    - Integer representing the column index for the AI's move or -2 if no valid moves are available.
+    """
+    deadline = time.perf_counter() + time_ms / 1000
+    if transposition_table is None:
+        transposition_table = TranspositionTable()
+
+    if spec is None:
+        spec = BoardSpec.for_grid(grid)
+    ordered_moves = [col for col in spec.center_order if grid[0][col] == ' ']
+    if not ordered_moves:
+        return -2  # No valid moves
+
+    # A legal move is always available, even if the first iteration does not finish in time
+    best_move = ordered_moves[0]
+    # Killer moves and history scores are kept from one iteration to the next
+    ordering = MoveOrdering(spec)
+    empty_cells = sum(row.count(' ') for row in grid)
+
+    for depth in range(0, min(max_depth, empty_cells - 1) + 1):
+        # Start with the best move of the previous iteration
+        ordered_moves.remove(best_move)
+        ordered_moves.insert(0, best_move)
+
+        position = BitboardPosition.from_grid(grid, player, evaluator, spec)
+        iteration_move = None
+        best_score = float('-inf')
+        try:
+            for col in ordered_moves:
+                timer = RootMoveTimer(stats)
+                position.push(col)
+                score = -negamax_inplace(position, float('-inf'), -best_score, depth, transposition_table, deadline,
+                                         stats, ordering)
+                position.pop()
+                timer.stop(col, depth, score)
+                if score > best_score:
+                    best_score = score
+                    iteration_move = col
+        except SearchTimeout:
+            # Moves completed in the interrupted iteration were compared against the previous best move,
+            # which was searched first, so a move found better is kept
+            if iteration_move is not None:
+                best_move = iteration_move
+            break
+
+        best_move = iteration_move
+        # A forced win or loss has been found, searching deeper does not change the move
+        if abs(best_score) >= 1000:
             break
 
     return best_move
+
+
+# -----
+# Analysis: the score of every move
+# -----
+
+def principal_variation(position, transposition_table, max_length):
+    """
+    Follows the best moves stored in the transposition table from a position.
+    Parameters:
+    - position: BitboardPosition or Position, restored on return.
+    - transposition_table: TranspositionTable filled by a search of the position.
+    - max_length: Largest number of moves returned.
+    Returns: List of the columns of the expected continuation, ending with a winning move if one is found.
+    """
+    moves = []
+    pushed = 0
+    while len(moves) < max_length and not position.is_terminal():
+        winning = position.winning_moves()
+        if winning:
+            moves.append(winning[0])
+            break
+        position_key, mirrored = position.canonical_key()
+        entry = transposition_table.probe(position_key)
+        if entry is None or entry[3] is None:
+            break
+        move = position.mirror_move(entry[3]) if mirrored else entry[3]
+        position.push(move)
+        pushed += 1
+        moves.append(move)
+    for _ in range(pushed):
+        position.pop()
+    return moves
+
+
+def analyze(grid, player, depth=None, time_ms=None, transposition_table=None, evaluator='classic', stats=None,
+            spec=None, deadline=None):
+    """
+    Computes the score of every playable column, where the move functions only find the best one: every move is
+    searched with a full window, so its score is exact and not a bound, and all the searches share the
+    transposition table, so the positions reached by several moves are searched once.
+    Parameters:
+    - grid: 2D list representing the game board, left unchanged.
+    - player: Character of the player to move.
+    - depth: Depth of the search below each move, DIFFICULTY_DEPTHS['hard'] if neither depth nor time_ms is given.
+      With time_ms, the largest depth of the search.
+    - time_ms: Optional time budget in milliseconds. The moves are then searched deeper and deeper until the budget
+      is spent, and each keeps the result of its deepest completed search.
+    - transposition_table: Optional TranspositionTable shared by the searches.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+    - stats: Optional SearchStats collecting the statistics of all the searches.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - deadline: Optional time.perf_counter() value or SearchStop ending the analysis, instead of the end of time_ms.
+    Returns:
+    - Dictionary mapping each playable column to a dictionary with the score of the move for the player
+      (1000 for a forced win, -1000 for a forced loss), the depth of its search, its principal variation
+      (the list of columns expected to be played, starting with the move) and the number of nodes searched for
+      it. With time_ms or a deadline, the columns whose first search did not end in time are missing.
+    """
+    if transposition_table is None:
+        transposition_table = TranspositionTable()
+    if depth is None and time_ms is None:
+        depth = DIFFICULTY_DEPTHS['hard']
+    if deadline is None and time_ms is not None:
+        deadline = time.perf_counter() + time_ms / 1000
+
+    position = BitboardPosition.from_grid(grid, player, evaluator, spec)
+    spec = position.spec
+    ordering = MoveOrdering(spec)
+    columns = [col for col in spec.center_order if grid[0][col] == ' ']
+    if time_ms is None:
+        depths = [depth]
+    else:
+        empty_cells = spec.cells - position.moves
+        depths = range(0, min(depth if depth is not None else empty_cells, empty_cells - 1) + 1)
+
+    results = {}
+    try:
+        for search_depth in depths:
+            for col in columns:
+                move_stats = SearchStats()
+                position.push(col)
+                score = -negamax_inplace(position, float('-inf'), float('inf'), search_depth, transposition_table,
+                                         deadline, move_stats, ordering)
+                principal = [col] + principal_variation(position, transposition_table, search_depth)
+                position.pop()
+                nodes = move_stats.nodes + results.get(col, {}).get('nodes', 0)
+                results[col] = {'score': score, 'depth': search_depth, 'pv': principal, 'nodes': nodes}
+                if stats is not None:
+                    stats.merge(move_stats)
+            # Every move leads to a forced win or loss, searching deeper does not change the scores
+            if all(abs(results[col]['score']) >= 1000 for col in columns):
+                break
+    except SearchTimeout:
+        pass
+    return {col: results[col] for col in sorted(results)}
@@ -0,0 +1,133 @@
+import numpy as np
+from BitboardPosition import BitboardPosition, cell_bit
+from WindowScore import WINDOW_WEIGHTS, WINDOW_VALUES
+from BoardSpec import STANDARD_SPEC
+
+# -------------------------------------------------------
+# Batch evaluation: window scores of many boards at once with NumPy
+# -------------------------------------------------------
+# Offline tool for large position sets (tournament analysis, tuning), the search keeps
+# evaluating one position at a time. Boards are int8 arrays of shape (N, rows, cols), row 0
+# at the top as in the grids, holding 1 for an 'R' piece, -1 for a 'J' piece and 0 for an
+# empty cell. The scores are those of the 'windows' evaluator: 1000 / -1000 when 'R' / 'J'
+# has four aligned pieces, 0 for a full board, otherwise the sum of the window values.
+# The 'classic' evaluator of Position.evaluate is not computed here, hence the 'windows' in the names.
+# Boards of any size are evaluated, always for four in a row.
+
+RED = 1
+YELLOW = -1
+
+CONNECT = len(WINDOW_WEIGHTS) - 1
+
+# A window holding r 'R' pieces and y 'J' pieces is coded r * (CONNECT + 1) + y, the sum of the codes of its
+# cells: each 'R' piece counts CONNECT + 1 and each 'J' piece 1. WINDOW_VALUES flattened is indexed by this code.
+RED_CODE = CONNECT + 1
+YELLOW_CODE = 1
+WINDOW_VALUE_TABLE = np.array(WINDOW_VALUES, dtype=np.int16).reshape(-1)
+# Cell code of a cell value v: v * v * SQUARE_FACTOR + v * LINEAR_FACTOR (1 -> RED_CODE, -1 -> YELLOW_CODE, 0 -> 0)
+SQUARE_FACTOR = np.int8((RED_CODE + YELLOW_CODE) // 2)
+LINEAR_FACTOR = np.int8((RED_CODE - YELLOW_CODE) // 2)
+RED_WIN_CODE = CONNECT * RED_CODE
+YELLOW_WIN_CODE = CONNECT * YELLOW_CODE
+
+# Boards evaluated together, bounding the memory used by the intermediate arrays
+CHUNK_SIZE = 1 << 14
+
+# Cell values of the grid characters, indexed by character code
+CHARACTER_VALUES = np.zeros(256, dtype=np.int8)
+CHARACTER_VALUES[ord('R')] = RED
+CHARACTER_VALUES[ord('J')] = YELLOW
+
+
+def window_codes(cells):
+    """
+    Computes the code of every window of every board with shifted sums, one per direction.
+    Parameters:
+    - cells: int8 array of shape (rows, cols, N) with the code of every cell, the boards along the last axis
+      so that every shifted sum works on contiguous memory.
+    Returns: int8 array of shape (number of windows, N) with the code of every window.
+    """
+    rows, cols, count = cells.shape
+    span_rows = rows - CONNECT + 1
+    span_cols = cols - CONNECT + 1
+    horizontal = sum(cells[:, i:span_cols + i] for i in range(CONNECT))
+    vertical = sum(cells[i:span_rows + i] for i in range(CONNECT))
+    diagonal = sum(cells[i:span_rows + i, i:span_cols + i] for i in range(CONNECT))
+    anti_diagonal = sum(cells[i:span_rows + i, CONNECT - 1 - i:cols - i] for i in range(CONNECT))
+    return np.concatenate([horizontal.reshape(-1, count), vertical.reshape(-1, count),
+                           diagonal.reshape(-1, count), anti_diagonal.reshape(-1, count)])
+
+
+def evaluate_windows_batch(boards):
+    """
+    Evaluates many boards from the perspective of the 'R' player, as BitboardPosition.evaluate with the
+    'windows' evaluator.
+    Parameters:
+    - boards: Array-like of shape (N, rows, cols) with 1 for 'R', -1 for 'J' and 0 for empty cells.
+      An int8 NumPy array is read in place, without conversion.
+    Returns: int32 array of the N scores.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    scores = np.empty(len(boards), dtype=np.int32)
+    for start in range(0, len(boards), CHUNK_SIZE):
+        cells = np.ascontiguousarray(boards[start:start + CHUNK_SIZE].transpose(1, 2, 0))
+        cells = cells * cells * SQUARE_FACTOR + cells * LINEAR_FACTOR
+        codes = window_codes(cells)
+        values = np.take(WINDOW_VALUE_TABLE, codes).sum(axis=0, dtype=np.int32)
+        values[(cells != 0).all(axis=(0, 1))] = 0
+        values[(codes == YELLOW_WIN_CODE).any(axis=0)] = -1000
+        values[(codes == RED_WIN_CODE).any(axis=0)] = 1000
+        scores[start:start + CHUNK_SIZE] = values
+    return scores
+
+
+def bitboards_to_array(red, yellow, spec=STANDARD_SPEC):
+    """
+    Unpacks bitboards into the board array format, all the boards at once.
+    Parameters:
+    - red: Array-like of the N bitboards of the 'R' stones, in the BitboardPosition layout.
+    - yellow: Array-like of the N bitboards of the 'J' stones.
+    - spec: BoardSpec giving the dimensions and the bitboard layout of the boards.
+    Returns: int8 array of shape (N, spec.rows, spec.cols).
+    """
+    if spec.h1 * spec.cols > 64:
+        raise ValueError(f"Les bitboards d'une grille {spec.cols}x{spec.rows} dépassent 64 bits")
+    cell_bits = np.array([[cell_bit(row, col, spec) for col in range(spec.cols)] for row in range(spec.rows)],
+                         dtype=np.uint64)
+    red = np.asarray(red, dtype=np.uint64)[:, None, None]
+    yellow = np.asarray(yellow, dtype=np.uint64)[:, None, None]
+    one = np.uint64(1)
+    return (((red >> cell_bits) & one).astype(np.int8) - ((yellow >> cell_bits) & one).astype(np.int8))
+
+
+def evaluate_windows_bitboards(red, yellow, spec=STANDARD_SPEC):
+    """
+    Evaluates many boards given as bitboards, see evaluate_windows_batch.
+    Parameters:
+    - red: Array-like of the N bitboards of the 'R' stones.
+    - yellow: Array-like of the N bitboards of the 'J' stones.
+    - spec: BoardSpec giving the dimensions and the bitboard layout of the boards.
+    Returns: int32 array of the N scores.
+    """
+    return evaluate_windows_batch(bitboards_to_array(red, yellow, spec))
+
+
+def positions_to_array(positions):
+    """
+    Converts Position or BitboardPosition objects into the board array format. BitboardPosition objects are
+    unpacked from their bitboards with vectorized operations when they fit in 64 bits, other positions are
+    read from their grid.
+    Parameters:
+    - positions: List of Position or BitboardPosition objects.
+    Returns: int8 array of shape (N, rows, cols).
+    """
+    if (positions and all(isinstance(position, BitboardPosition) for position in positions)
+            and positions[0].spec.h1 * positions[0].spec.cols <= 64):
+        red = np.fromiter((position.red_stones() for position in positions), dtype=np.uint64, count=len(positions))
+        mask = np.fromiter((position.mask for position in positions), dtype=np.uint64, count=len(positions))
+        return bitboards_to_array(red, red ^ mask, positions[0].spec)
+
+    grids = [position.grid for position in positions]
+    rows, cols = (len(grids[0]), len(grids[0][0])) if grids else (6, 7)
+    cells = ''.join(''.join(row) for grid in grids for row in grid).encode('ascii')
+    return CHARACTER_VALUES[np.frombuffer(cells, dtype=np.uint8)].reshape(len(grids), rows, cols)
@@ -0,0 +1,289 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from AiMoves import negamax_inplace
+from BitboardPosition import BitboardPosition
+from BoardSpec import STANDARD_SPEC
+from MoveOrdering import MoveOrdering
+from Position import Position
+from SearchStats import SearchStats
+from GameRecord import moves_to_grid
+from TranspositionTable import TranspositionTable
+
+# -------------------------------------------------------
+# Benchmark: timings of the engine hot paths on a fixed corpus
+# -------------------------------------------------------
+# Every benchmark runs on the same positions of the standard board, given by their moves, so
+# two runs measure the same work: the results of a change are compared with those saved before
+# it. A benchmark is timed several times and its best time is kept, the other runs being slowed
+# down by the rest of the machine. Its peak memory is measured on a separate run with tracemalloc,
+# which slows the code down too much to be timed at the same time.
+# Searches also report their number of nodes: a change of the nodes is a change of the search
+# itself, a change of the time at the same nodes is a change of its speed.
+
+# Positions of the corpus, by phase of the game, with no winner and no immediate win for the player to move
+CORPUS = {
+    'opening': ['146660', '660002'],
+    'midgame': ['5613661025514321', '1230025025520223'],
+    # The player to move has a single move not losing at once
+    'tactical': ['560164026066', '534353316011'],
+    'endgame': ['05340210326421555135544612262300', '15634501435045631436425663250422'],
+}
+
+SEARCH_DEPTHS = (3, 5, 8)
+
+# Passes over the corpus of a hot path benchmark, to time more than a few microseconds
+HOT_PATH_ROUNDS = 200
+
+# Smallest time of a measurement: short benchmarks are run several times in a row
+MIN_SECONDS = 0.2
+
+# A benchmark slower than its baseline by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.10
+
+
+def corpus_positions(position_class=BitboardPosition, evaluator='classic'):
+    """
+    Builds the positions of the corpus.
+    Parameters:
+    - position_class: Position or BitboardPosition.
+    - evaluator: Heuristic of the positions, 'classic' or 'windows'.
+    Returns: List of tuples (phase, index in the phase, position).
+    """
+    positions = []
+    for phase, games in CORPUS.items():
+        for index, moves in enumerate(games):
+            grid = moves_to_grid(moves, STANDARD_SPEC)
+            player = 'R' if len(moves) % 2 == 0 else 'J'
+            if position_class is Position:
+                position = Position(grid, player, evaluator=evaluator)
+            else:
+                position = BitboardPosition.from_grid(grid, player, evaluator)
+            positions.append((phase, index, position))
+    return positions
+
+
+# -----
+# Benchmarks: each one runs its work once and returns the number of operations, or of nodes for searches
+# -----
+
+def bench_check_winner(positions):
+    """
+    Checks the winner after every move of every position, as the search does.
+    Parameters:
+    - positions: Positions to use, left unchanged.
+    Returns: Number of calls to check_winner.
+    """
+    calls = 0
+    for position in positions:
+        for col in position.generate_moves():
+            position.push(col)
+            position.check_winner()
+            position.pop()
+            calls += 1
+    return calls
+
+
+def bench_evaluate(positions):
+    """
+    Evaluates the position after every move of every position.
+    Parameters:
+    - positions: Positions to use, left unchanged.
+    Returns: Number of calls to evaluate.
+    """
+    calls = 0
+    for position in positions:
+        for col in position.generate_moves():
+            position.push(col)
+            position.evaluate()
+            position.pop()
+            calls += 1
+    return calls
+
+
+def bench_generate_play(positions):
+    """
+    Generates the moves of every position and plays each of them into a new position.
+    Parameters:
+    - positions: Positions to use.
+    Returns: Number of positions created.
+    """
+    calls = 0
+    for position in positions:
+        for col in position.generate_moves():
+            position.play(col)
+            calls += 1
+    return calls
+
+
+def bench_search(positions, depth):
+    """
+    Searches every position with negamax, each with a new transposition table.
+    Parameters:
+    - positions: BitboardPositions to search, left unchanged.
+    - depth: Depth of the searches.
+    Returns: Number of nodes searched.
+    """
+    stats = SearchStats()
+    for position in positions:
+        spec = position.spec
+        negamax_inplace(position, float('-inf'), float('inf'), depth, TranspositionTable(), stats=stats,
+                        ordering=MoveOrdering(spec))
+    return stats.nodes
+
+
+def benchmarks(depths=SEARCH_DEPTHS, rounds=HOT_PATH_ROUNDS):
+    """
+    Lists the benchmarks of the suite.
+    Parameters:
+    - depths: Depths of the search benchmarks.
+    - rounds: Passes over the corpus of the hot path benchmarks.
+    Returns: List of tuples (name, unit, function running the benchmark once and returning its count).
+    """
+    suite = []
+    for position_class in (Position, BitboardPosition):
+        positions = [position for _, _, position in corpus_positions(position_class)]
+        for name, function in (('check_winner', bench_check_winner), ('evaluate', bench_evaluate),
+                               ('generate_play', bench_generate_play)):
+            suite.append((f"{position_class.__name__}.{name}", 'calls',
+                          lambda function=function, positions=positions: sum(function(positions)
+                                                                              for _ in range(rounds))))
+    for phase in CORPUS:
+        positions = [position for position_phase, _, position in corpus_positions() if position_phase == phase]
+        for depth in depths:
+            suite.append((f"negamax.{phase}.depth{depth}", 'nodes',
+                          lambda positions=positions, depth=depth: bench_search(positions, depth)))
+    return suite
+
+
+def measure(function, min_seconds=MIN_SECONDS):
+    """
+    Times a benchmark, running it again until min_seconds have passed.
+    Parameters:
+    - function: Function running the benchmark once and returning its count.
+    - min_seconds: Smallest time of the measurement.
+    Returns: Tuple (count, seconds) of one run.
+    """
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        count = function()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return count, elapsed / runs
+
+
+def run_benchmarks(depths=SEARCH_DEPTHS, rounds=HOT_PATH_ROUNDS, repeat=3, memory=True, only=None, progress=None,
+                   min_seconds=MIN_SECONDS):
+    """
+    Runs the benchmarks of the suite.
+    Parameters:
+    - depths: Depths of the search benchmarks.
+    - rounds: Passes over the corpus of the hot path benchmarks.
+    - repeat: Number of timed runs of every benchmark, the best one being kept.
+    - memory: Whether to measure the peak memory of every benchmark, on one more run.
+    - only: Optional string, only the benchmarks whose name contains it are run.
+    - progress: Optional function called with the name of every benchmark before it runs.
+    - min_seconds: Smallest time of every timed run.
+    Returns: Dictionary with the environment of the run and, by benchmark name, its count, best time, rate and
+    peak memory.
+    """
+    results = {}
+    for name, unit, function in benchmarks(depths, rounds):
+        if only is not None and only not in name:
+            continue
+        if progress is not None:
+            progress(name)
+        best = float('inf')
+        for _ in range(repeat):
+            count, seconds = measure(function, min_seconds)
+            best = min(best, seconds)
+        result = {'unit': unit, 'count': count, 'seconds': best, 'per_second': count / best if best else 0.0}
+        if memory:
+            tracemalloc.start()
+            function()
+            result['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        results[name] = result
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'benchmarks': results}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares results with a baseline saved by an earlier run.
+    Parameters:
+    - results: Dictionary of run_benchmarks.
+    - baseline: Dictionary of run_benchmarks of the reference version.
+    - threshold: Fraction of speed lost above which a benchmark is a regression.
+    Returns: List of dictionaries, one per benchmark of both runs, with the change of speed (0.05 for 5% faster),
+    whether it is a regression and whether the count changed (a search exploring other nodes).
+    """
+    comparisons = []
+    for name, result in results['benchmarks'].items():
+        reference = baseline['benchmarks'].get(name)
+        if reference is None:
+            continue
+        # A search exploring other nodes is compared on its time, the work to do being part of the change
+        if result['count'] == reference['count']:
+            change = result['per_second'] / reference['per_second'] - 1 if reference['per_second'] else 0.0
+        else:
+            change = reference['seconds'] / result['seconds'] - 1 if result['seconds'] else 0.0
+        comparisons.append({'name': name, 'change': change, 'regression': change < -threshold,
+                            'count_changed': result['count'] != reference['count'],
+                            'count': result['count'], 'baseline_count': reference['count']})
+    return comparisons
+
+
+def print_results(results, comparisons=None):
+    """
+    Prints the table of the benchmarks and, if given, their comparison with the baseline.
+    Parameters:
+    - results: Dictionary of run_benchmarks.
+    - comparisons: Optional list of compare.
+    """
+    changes = {comparison['name']: comparison for comparison in comparisons or []}
+    print(f"{'Mesure':<34} {'Nombre':>10} {'Temps (s)':>10} {'Par seconde':>12} {'Mémoire (Ko)':>13} "
+          f"{'Écart':>8}")
+    for name, result in results['benchmarks'].items():
+        memory = f"{result['peak_kb']:.1f}" if 'peak_kb' in result else '-'
+        line = f"{name:<34} {result['count']:>10} {result['seconds']:>10.4f} {result['per_second']:>12.0f} {memory:>13}"
+        if name in changes:
+            comparison = changes[name]
+            line += f" {comparison['change']:>+8.1%}"
+            if comparison['regression']:
+                line += " RÉGRESSION"
+            if comparison['count_changed']:
+                line += f" ({comparison['baseline_count']} {result['unit']} avant)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure les performances du moteur sur un corpus de positions fixe")
+    parser.add_argument('--json', metavar='FICHIER', help="écrit les résultats dans un fichier JSON")
+    parser.add_argument('--baseline', metavar='FICHIER', help="compare les résultats à ceux d'un fichier JSON")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="perte de vitesse au-delà de laquelle une mesure régresse (0.10 par défaut)")
+    parser.add_argument('--repeat', type=int, default=3, help="nombre de mesures de chaque test (3 par défaut)")
+    parser.add_argument('--depths', type=int, nargs='+', default=list(SEARCH_DEPTHS),
+                        help="profondeurs des recherches (3 5 8 par défaut)")
+    parser.add_argument('--only', metavar='NOM', help="ne lance que les tests dont le nom contient NOM")
+    parser.add_argument('--no-memory', action='store_true', help="ne mesure pas la mémoire")
+    args = parser.parse_args()
+
+    run = run_benchmarks(args.depths, repeat=args.repeat, memory=not args.no_memory, only=args.only,
+                         progress=lambda name: print(f"{name}...", file=sys.stderr))
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            comparison = compare(run, json.load(baseline_file), args.threshold)
+    print_results(run, comparison)
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(run, results_file, indent=2)
+    if comparison and any(item['regression'] for item in comparison):
+        sys.exit(1)
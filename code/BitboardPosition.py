@@ -0,0 +1,498 @@
+from WindowScore import WindowScore
+from BoardSpec import BoardSpec, STANDARD_SPEC
+
+# -------------------------------------------------------
+# Bitboard layout
+# -------------------------------------------------------
+# Each column uses rows + 1 bits, the extra bit on top of every column is a
+# sentinel that is never set, so shifted alignments never wrap between columns.
+# Bit index of a cell: col * (rows + 1) + row counted from the bottom.
+# The masks of a board are in its BoardSpec, the standard board is shown here.
+#
+#   .  .  .  .  .  .  .      <- sentinel row
+#   5 12 19 26 33 40 47
+#   4 11 18 25 32 39 46
+#   3 10 17 24 31 38 45
+#   2  9 16 23 30 37 44
+#   1  8 15 22 29 36 43
+#   0  7 14 21 28 35 42
+
+# Standard board, the only one of the opening books
+WIDTH = STANDARD_SPEC.cols
+HEIGHT = STANDARD_SPEC.rows
+COLUMN_MASKS = STANDARD_SPEC.column_masks
+
+
+def cell_bit(row, col, spec=STANDARD_SPEC):
+    """
+    Converts a grid cell into its bit index.
+    Parameters:
+    - row: Row index in the grid (0 is the top row).
+    - col: Column index in the grid.
+    - spec: BoardSpec of the board.
+    Returns: Integer bit index of the cell in the bitboard.
+    """
+    return col * spec.h1 + (spec.rows - 1 - row)
+
+
+def has_alignment(stones, spec=STANDARD_SPEC):
+    """
+    Checks whether a bitboard contains spec.connect aligned stones.
+    Parameters:
+    - stones: Bitboard of the stones of a single player.
+    - spec: BoardSpec of the board.
+    Returns: Boolean indicating if the stones contain a winning line.
+    """
+    connect = spec.connect
+    for shift in spec.directions:
+        # Bits starting a run of `length` stones, the length doubling at each step
+        run = stones
+        length = 1
+        while run and 2 * length <= connect:
+            run &= run >> (length * shift)
+            length *= 2
+        if length < connect:
+            run &= run >> ((connect - length) * shift)
+        if run:
+            return True
+    return False
+
+
+def winning_cells(stones, mask, spec=STANDARD_SPEC):
+    """
+    Finds the empty cells that would complete spec.connect aligned stones for a player.
+    Parameters:
+    - stones: Bitboard of the stones of the player.
+    - mask: Bitboard of all the stones on the board.
+    - spec: BoardSpec of the board.
+    Returns: Bitboard of the empty cells (playable now or later) where the player would win.
+    """
+    if spec.connect == 4:
+        h1 = spec.h1
+        # Vertical: three stones below the cell
+        cells = (stones << 1) & (stones << 2) & (stones << 3)
+        for shift in (h1, h1 - 1, h1 + 1):
+            # Horizontal and both diagonals: the cell can be at any of the four places of the line
+            pairs = (stones << shift) & (stones << (2 * shift))
+            cells |= pairs & (stones << (3 * shift))
+            cells |= pairs & (stones >> shift)
+            pairs = (stones >> shift) & (stones >> (2 * shift))
+            cells |= pairs & (stones << shift)
+            cells |= pairs & (stones >> (3 * shift))
+        return cells & (spec.board_mask ^ mask)
+
+    cells = 0
+    last = spec.connect - 1
+    for shift in spec.directions:
+        # before[k]: the k cells before the cell in this direction hold stones, after[k] the k cells after it
+        before = [-1]
+        after = [-1]
+        for k in range(1, last + 1):
+            before.append(before[-1] & (stones << (k * shift)))
+            after.append(after[-1] & (stones >> (k * shift)))
+        for k in range(last + 1):
+            cells |= before[k] & after[last - k]
+    return cells & (spec.board_mask ^ mask)
+
+
+def playable_cells(mask, spec=STANDARD_SPEC):
+    """
+    Finds the cells where a piece would land in every column that is not full.
+    Parameters:
+    - mask: Bitboard of all the stones on the board.
+    - spec: BoardSpec of the board.
+    Returns: Bitboard with one cell per playable column.
+    """
+    return (mask + spec.bottom_row) & spec.board_mask
+
+
+def non_losing_cells(current, mask, spec=STANDARD_SPEC):
+    """
+    Finds the moves of the player to move that do not let the opponent win on the next move: the only block
+    when the opponent threatens to win, and never the cell right below a winning cell of the opponent.
+    Parameters:
+    - current: Bitboard of the stones of the player to move.
+    - mask: Bitboard of all the stones on the board.
+    - spec: BoardSpec of the board.
+    Returns: Bitboard of the landing cells of these moves, 0 if the opponent wins whatever is played.
+    """
+    possible = playable_cells(mask, spec)
+    opponent_wins = winning_cells(current ^ mask, mask, spec)
+    forced = possible & opponent_wins
+    if forced:
+        if forced & (forced - 1):
+            return 0  # Two threats, only one can be blocked
+        possible = forced
+    return possible & ~(opponent_wins >> 1)
+
+
+def run_masks(red, spec=STANDARD_SPEC):
+    """
+    Computes, for every run length, the cells whose longest run of 'R' stones passing through them reaches it.
+    The run through a cell counts the cell itself plus the adjacent 'R' stones, as in Position.evaluate_position.
+    Parameters:
+    - red: Bitboard of the 'R' stones, runs are always counted in 'R' stones.
+    - spec: BoardSpec of the board.
+    Returns: List where index i holds the bitboard of the cells with a run of at least i + 2.
+    """
+    reach = []
+    for shift in spec.directions:
+        # forward[k]: the k cells after the cell in this direction are all 'R', backward[k] the k cells before it
+        forward = [spec.board_mask]
+        run = red >> shift
+        step = shift
+        while run:
+            forward.append(run)
+            step += shift
+            run &= red >> step
+        backward = [spec.board_mask]
+        run = red << shift
+        step = shift
+        while run:
+            backward.append(run)
+            step += shift
+            run &= red << step
+
+        # A run of a given length needs forward and backward extensions adding up to length - 1
+        for length in range(2, len(forward) + len(backward)):
+            reached = 0
+            for ahead in range(max(0, length - len(backward)), min(length, len(forward))):
+                reached |= forward[ahead] & backward[length - 1 - ahead]
+            if len(reach) < length - 1:
+                reach.append(0)
+            reach[length - 2] |= reached
+    return reach
+
+
+def longest_line(stones, bit, spec=STANDARD_SPEC):
+    """
+    Measures the longest line of stones that a stone on a given cell would be part of.
+    Parameters:
+    - stones: Bitboard of the stones of a single player.
+    - bit: Bit index of the cell.
+    - spec: BoardSpec of the board.
+    Returns: Integer length of the longest line through the cell, the cell included.
+    """
+    best = 1
+    for shift in spec.directions:
+        count = 1
+        other = bit + shift
+        while (stones >> other) & 1:
+            count += 1
+            other += shift
+        other = bit - shift
+        while other >= 0 and (stones >> other) & 1:
+            count += 1
+            other -= shift
+        best = max(best, count)
+    return best
+
+def mirror(bitboard, spec=STANDARD_SPEC):
+    """
+    Mirrors a bitboard left-right: the first column becomes the last one. The whole rows + 1 bits of every
+    column are moved, so the sum current + mask used in the keys can be mirrored as well.
+    Parameters:
+    - bitboard: Bitboard to mirror.
+    - spec: BoardSpec of the board.
+    Returns: Integer bitboard of the mirror image.
+    """
+    h1 = spec.h1
+    column = (1 << h1) - 1
+    mirrored = 0
+    for shift in range(0, spec.cols * h1, h1):
+        mirrored = (mirrored << h1) | ((bitboard >> shift) & column)
+    return mirrored
+
+
+def canonical_stones(current, mask, spec=STANDARD_SPEC):
+    """
+    Folds a position and its mirror image together: of the two, the one with the smallest current + mask.
+    Parameters:
+    - current: Bitboard of the stones of the player to move.
+    - mask: Bitboard of all the stones.
+    - spec: BoardSpec of the board.
+    Returns: Tuple (stones, mirrored) where stones is current + mask of the chosen position and mirrored tells
+    if it is the mirror image.
+    """
+    stones = current + mask
+    mirrored = mirror(stones, spec)
+    if mirrored < stones:
+        return mirrored, True
+    return stones, False
+
+
+# Marker for a winner that has not been computed yet (None means no winner)
+_UNKNOWN = object()
+
+# -------------------------------------------------------
+# Class Definition: BitboardPosition Class, a compact game state for the search
+# -------------------------------------------------------
+
+
+class BitboardPosition:
+    """
+    Represents the current state of the game with two bitboards instead of a grid.
+    It exposes the same interface as Position so it can be used by the search and the game modes.
+    """
+
+    def __init__(self, current, mask, moves, current_player, last_move=None, window_score=None, spec=STANDARD_SPEC):
+        """
+        Initializes the position from its bitboards.
+        Parameters:
+        - current: Bitboard of the stones of the player to move.
+        - mask: Bitboard of all the stones on the board.
+        - moves: Number of stones played so far.
+        - current_player: Character representing the current player.
+        - last_move: Optional column of the last piece played. When given, the position before that move is
+          assumed to have no winner, so only the stones of the player who just moved are checked.
+        - window_score: Optional WindowScore matching the stones, selects the 'windows' evaluator.
+        - spec: BoardSpec of the board.
+        """
+        self.spec = spec
+        self.current = current
+        self.mask = mask
+        self.moves = moves
+        self.current_player = current_player
+        self.last_move = last_move
+        self._winner = _UNKNOWN
+        self.window_score = window_score
+        # Moves made with push(), with what is needed to take them back
+        self.history = []
+
+    @classmethod
+    def from_grid(cls, grid, current_player, evaluator='classic', spec=None):
+        """
+        Builds a bitboard position from the grid format used by Position.
+        Parameters:
+        - grid: 2D list representing the game board.
+        - current_player: Character representing the current player.
+        - evaluator: Heuristic used by evaluate(), 'classic' (longest runs) or 'windows' (incremental window score).
+        - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+        Returns: New BitboardPosition object representing the same game state.
+        """
+        if spec is None:
+            spec = BoardSpec.for_grid(grid)
+        current = 0
+        mask = 0
+        moves = 0
+        for row in range(spec.rows):
+            for col in range(spec.cols):
+                cell = grid[row][col]
+                if cell != ' ':
+                    bit = 1 << cell_bit(row, col, spec)
+                    mask |= bit
+                    moves += 1
+                    if cell == current_player:
+                        current |= bit
+        window_score = WindowScore.from_grid(grid, spec) if evaluator == 'windows' else None
+        return cls(current, mask, moves, current_player, window_score=window_score, spec=spec)
+
+    def to_grid(self):
+        """
+        Converts the position back into the grid format used by Position.
+        Returns: 2D list representing the game board.
+        """
+        opponent = 'R' if self.current_player == 'J' else 'J'
+        grid = self.spec.empty_grid()
+        for row in range(self.spec.rows):
+            for col in range(self.spec.cols):
+                bit = 1 << cell_bit(row, col, self.spec)
+                if self.mask & bit:
+                    grid[row][col] = self.current_player if self.current & bit else opponent
+        return grid
+
+    @property
+    def grid(self):
+        """
+        Grid view of the position, rebuilt on every access. Prefer the bitboards in hot paths.
+        """
+        return self.to_grid()
+
+    def key(self):
+        """
+        Computes a unique key for the position, usable in a transposition table.
+        Returns: Integer encoding the stones and the player to move.
+        """
+        return ((self.current + self.mask) << 1) | (self.current_player == 'R')
+
+    def canonical_key(self):
+        """
+        Computes a key shared by the position and its mirror image, so a transposition table stores them once.
+        The moves stored under this key are those of the position it was computed for: when mirrored is True
+        they must be translated with mirror_move() both ways.
+        Returns: Tuple (key, mirrored) where mirrored tells if the key is the key of the mirror image.
+        """
+        stones, mirrored = canonical_stones(self.current, self.mask, self.spec)
+        return (stones << 1) | (self.current_player == 'R'), mirrored
+
+    def mirror_move(self, move):
+        """
+        Translates a column into the mirror image of the board.
+        Parameters:
+        - move: Column index, or None.
+        Returns: Column index of the same move on the mirror image, or None.
+        """
+        return None if move is None else self.spec.cols - 1 - move
+
+    def red_stones(self):
+        """
+        Returns: Bitboard of the 'R' stones.
+        """
+        return self.current if self.current_player == 'R' else self.current ^ self.mask
+
+    def is_terminal(self):
+        """
+        Determines if the current game state is terminal (i.e., game over).
+        Returns: Boolean indicating if the game has ended.
+        """
+        return self.check_winner() is not None or self.moves == self.spec.cells
+
+    def evaluate(self):
+        """
+        Evaluates the game state from the perspective of the 'R' player, with the same scale as Position.evaluate.
+        With the 'windows' evaluator the heuristic part is the running window score, read in constant time.
+        Returns: Integer score indicating the state's favorability towards 'R'.
+        """
+        winner = self.check_winner()
+        if winner == 'R':
+            return 1000
+        elif winner == 'J':
+            return -1000
+        elif self.moves == self.spec.cells:
+            return 0
+
+        if self.window_score is not None:
+            return self.window_score.score
+
+        # Sum of the squared best runs of the 'R' cells minus the same sum over the 'J' cells
+        red = self.red_stones()
+        yellow = red ^ self.mask
+        score = red.bit_count() - yellow.bit_count()
+        for index, reached in enumerate(run_masks(red, self.spec)):
+            score += (2 * index + 3) * ((reached & red).bit_count() - (reached & yellow).bit_count())
+        return score
+
+    def evaluate_position(self, row, col):
+        """
+        Evaluates the favorability of a specific position on the board.
+        Parameters:
+        - row: Row index of the position.
+        - col: Column index of the position.
+        Returns: Integer score based on proximity to a winning condition.
+        """
+        return longest_line(self.red_stones(), cell_bit(row, col, self.spec), self.spec) ** 2
+
+    def evaluate_move(self, move):
+        """
+        Evaluates the cell where a piece dropped in the given column would land, used for move ordering.
+        Parameters:
+        - move: Column index of a playable column.
+        Returns: Integer score of the landing cell.
+        """
+        spec = self.spec
+        landing = (self.mask + spec.bottom_masks[move]) & spec.column_masks[move]
+        row = spec.rows - 1 - (landing.bit_length() - 1 - move * spec.h1)
+        return self.evaluate_position(row, move)
+
+    def move_priority(self, move):
+        """
+        Measures how urgent a move is, used for move ordering: the longest line through the landing cell,
+        made of the stones of the player to move (extending a line) or of the opponent (blocking it).
+        Parameters:
+        - move: Column index of a playable column.
+        Returns: Integer length of the longest line.
+        """
+        spec = self.spec
+        bit = ((self.mask + spec.bottom_masks[move]) & spec.column_masks[move]).bit_length() - 1
+        return max(longest_line(self.current, bit, spec), longest_line(self.current ^ self.mask, bit, spec))
+
+    def winning_moves(self):
+        """
+        Finds the moves winning immediately for the player to move.
+        Returns: List of column indices.
+        """
+        spec = self.spec
+        wins = winning_cells(self.current, self.mask, spec) & playable_cells(self.mask, spec)
+        return [col for col in range(spec.cols) if wins & spec.column_masks[col]] if wins else []
+
+    def non_losing_moves(self):
+        """
+        Finds the moves that do not let the opponent win on the next move.
+        Returns: List of column indices, empty if the opponent wins whatever is played.
+        """
+        spec = self.spec
+        moves = non_losing_cells(self.current, self.mask, spec)
+        return [col for col in range(spec.cols) if moves & spec.column_masks[col]]
+
+    def generate_moves(self):
+        """
+        Generates all possible moves for the current player.
+        Returns: List of column indices where the player can place their piece.
+        """
+        top_masks = self.spec.top_masks
+        return [col for col in range(self.spec.cols) if not self.mask & top_masks[col]]
+
+    def play(self, move):
+        """
+        Plays a move and returns the resulting game state.
+        Parameters:
+        - move: Column index where the piece is to be placed.
+        Returns: New BitboardPosition object representing the state after the move.
+        """
+        spec = self.spec
+        mask = self.mask | (self.mask + spec.bottom_masks[move])
+        window_score = None
+        if self.window_score is not None:
+            row = spec.rows - 1 - ((mask ^ self.mask).bit_length() - 1 - move * spec.h1)
+            window_score = self.window_score.copy()
+            window_score.add(row, move, self.current_player)
+        return BitboardPosition(self.current ^ self.mask, mask, self.moves + 1,
+                                'R' if self.current_player == 'J' else 'J', move, window_score, spec)
+
+    def push(self, move):
+        """
+        Plays a move in place, without creating a new BitboardPosition. The move can be taken back with pop().
+        Parameters:
+        - move: Column index where the piece is to be placed.
+        """
+        spec = self.spec
+        mask = self.mask | (self.mask + spec.bottom_masks[move])
+        self.history.append((self.current, self.mask, self.last_move, self._winner))
+        if self.window_score is not None:
+            row = spec.rows - 1 - ((mask ^ self.mask).bit_length() - 1 - move * spec.h1)
+            self.window_score.add(row, move, self.current_player)
+        self.current ^= self.mask
+        self.mask = mask
+        self.moves += 1
+        self.current_player = 'R' if self.current_player == 'J' else 'J'
+        self.last_move = move
+        self._winner = _UNKNOWN
+
+    def pop(self):
+        """
+        Takes back the last move made with push().
+        Returns: Column index of the move taken back.
+        """
+        move = self.last_move
+        mask = self.mask
+        self.current, self.mask, self.last_move, self._winner = self.history.pop()
+        self.moves -= 1
+        self.current_player = 'R' if self.current_player == 'J' else 'J'
+        if self.window_score is not None:
+            row = self.spec.rows - 1 - ((mask ^ self.mask).bit_length() - 1 - move * self.spec.h1)
+            self.window_score.remove(row, move, self.current_player)
+        return move
+
+    def check_winner(self):
+        """
+        Checks for a winner in the current game state. The result is computed once per position and cached.
+        Returns: Character of the winning player, or None if no winner.
+        """
+        if self._winner is _UNKNOWN:
+            self._winner = None
+            if has_alignment(self.current ^ self.mask, self.spec):
+                self._winner = 'R' if self.current_player == 'J' else 'J'
+            elif self.last_move is None and has_alignment(self.current, self.spec):
+                self._winner = self.current_player
+        return self._winner
+
@@ -0,0 +1,121 @@
+from UtilsPosition import build_windows, build_zobrist_keys, cell_rays
+
+# -------------------------------------------------------
+# Board specification: dimensions, win length and the tables derived from them
+# -------------------------------------------------------
+# Every table that depends on the board is computed once per specification and shared by all
+# the positions, searches and evaluators using it: the windows of the window evaluator, the
+# lines through each cell and the Zobrist keys of Position, and the masks of the bitboard
+# layout of BitboardPosition.
+
+
+def window_weights(connect):
+    """
+    Computes the value of a window by number of pieces for the window evaluator: nothing for an empty
+    window, then four times more for every extra piece.
+    Parameters:
+    - connect: Number of aligned pieces needed to win.
+    Returns: Tuple of connect + 1 weights, (0, 1, 4, 16, 64) for connect four.
+    """
+    return (0,) + tuple(4 ** pieces for pieces in range(connect))
+
+
+class BoardSpec:
+    """
+    Describes a board: its number of rows and columns and the number of aligned pieces needed to win.
+    Specifications with the same dimensions compare equal, and BoardSpec.of() returns a shared instance
+    so the tables are built only once.
+    """
+
+    # Instances returned by of(), by (rows, cols, connect)
+    _shared = {}
+
+    def __init__(self, rows=6, cols=7, connect=4):
+        """
+        Initializes the specification and computes its tables.
+        Parameters:
+        - rows: Number of rows of the board.
+        - cols: Number of columns of the board.
+        - connect: Number of aligned pieces needed to win.
+        """
+        if rows < 1 or cols < 1 or connect < 2 or connect > max(rows, cols):
+            raise ValueError(f"Grille invalide : {rows} lignes, {cols} colonnes, {connect} pions alignés")
+        self.rows = rows
+        self.cols = cols
+        self.connect = connect
+        self.cells = rows * cols
+        # Columns from the center outwards, the left one first among equals
+        self.center_order = sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1)))
+
+        # Window evaluator: the windows of connect cells and, for each cell, the indices of the windows containing it
+        self.windows, self.cell_windows = build_windows(rows, cols, connect)
+        # Win detection and classic evaluator of Position: the cells of the four lines through each cell
+        self.cell_rays = cell_rays(rows, cols)
+        self.window_weights = window_weights(connect)
+        # window_values[red][yellow]: value of a window from the perspective of 'R'
+        self.window_values = [[self.window_weights[red] if yellow == 0 else
+                               -self.window_weights[yellow] if red == 0 else 0
+                               for yellow in range(connect + 1)] for red in range(connect + 1)]
+
+        # Zobrist hashing of Position
+        self.zobrist_keys, self.zobrist_side = build_zobrist_keys(rows, cols)
+
+        # Bitboard layout of BitboardPosition: rows + 1 bits per column, the top one always empty
+        self.h1 = rows + 1
+        self.bottom_masks = [1 << (col * self.h1) for col in range(cols)]
+        self.top_masks = [1 << (rows - 1 + col * self.h1) for col in range(cols)]
+        self.column_masks = [((1 << rows) - 1) << (col * self.h1) for col in range(cols)]
+        self.board_mask = sum(self.column_masks)
+        self.bottom_row = sum(self.bottom_masks)
+        # Shifts for the four directions: vertical, horizontal and both diagonals
+        self.directions = (1, self.h1, self.h1 + 1, self.h1 - 1)
+
+    @classmethod
+    def of(cls, rows=6, cols=7, connect=4):
+        """
+        Returns the shared specification for the given dimensions, building it on first use.
+        Parameters:
+        - rows: Number of rows of the board.
+        - cols: Number of columns of the board.
+        - connect: Number of aligned pieces needed to win.
+        Returns: BoardSpec object.
+        """
+        key = (rows, cols, connect)
+        if key not in cls._shared:
+            cls._shared[key] = cls(rows, cols, connect)
+        return cls._shared[key]
+
+    @classmethod
+    def for_grid(cls, grid, connect=4):
+        """
+        Returns the shared specification matching the dimensions of a grid.
+        Parameters:
+        - grid: 2D list representing the game board.
+        - connect: Number of aligned pieces needed to win.
+        Returns: BoardSpec object.
+        """
+        return cls.of(len(grid), len(grid[0]), connect)
+
+    def empty_grid(self):
+        """
+        Returns: New empty grid with the dimensions of the specification.
+        """
+        return [[' ' for _ in range(self.cols)] for _ in range(self.rows)]
+
+    def __eq__(self, other):
+        return isinstance(other, BoardSpec) and (self.rows, self.cols, self.connect) == (
+            other.rows, other.cols, other.connect)
+
+    def __hash__(self):
+        return hash((self.rows, self.cols, self.connect))
+
+    def __reduce__(self):
+        # Sent to other processes as its dimensions, the tables are rebuilt (once) on the other side
+        return BoardSpec.of, (self.rows, self.cols, self.connect)
+
+    def __repr__(self):
+        return f"BoardSpec({self.rows}, {self.cols}, {self.connect})"
+
+
+# The standard board: 6 rows, 7 columns, four in a row
+STANDARD_SPEC = BoardSpec.of(6, 7, 4)
@@ -0,0 +1,173 @@
+import threading
+from AiMoves import analyze, principal_variation, SearchStop, RootSearchPool, DIFFICULTY_DEPTHS
+from BitboardPosition import BitboardPosition
+from Solver import Solver
+from BoardSpec import BoardSpec
+from UtilsAiMoves import make_ai_move, search_table
+from UtilsPosition import find_empty_row
+
+# -------------------------------------------------------
+# Engine: an AI player keeping its search state over a game
+# -------------------------------------------------------
+# make_ai_move starts every move from an empty transposition table. An engine keeps the table of
+# its player for the whole game, so the positions searched for a move are found again when the
+# next moves are searched. The table ages its entries at every move, the results of the earlier
+# moves giving way to new ones, and new_game() starts again from an empty table.
+# While the opponent thinks, ponder() searches the replies they may play in a background thread,
+# the predicted one first, filling the same table: when the opponent has played, move() stops
+# pondering and finds the scores of its own moves already in the table. The thread mostly runs
+# while the game waits for the opponent's input, when the main thread does not need the processor.
+# An engine searching with several processes starts them at its first move and keeps them until
+# close().
+
+
+class Engine:
+    """
+    AI player of a game: plays the moves of one player at one difficulty level with a transposition table,
+    or for the 'perfect' level a solver, kept between the moves.
+    """
+
+    def __init__(self, player, difficulty, evaluator='classic', time_ms=None, workers=1, spec=None, cache=None,
+                 depth=None):
+        """
+        Initializes the engine for a new game.
+        Parameters:
+        - player: Character of the player the engine plays ('R' or 'J').
+        - difficulty: Difficulty level ('easy', 'medium', 'hard', 'perfect'), ignored when time_ms or depth is given.
+        - evaluator: Heuristic used at the leaves of the search, 'classic' or 'windows'.
+        - time_ms: Optional time budget per move in milliseconds.
+        - workers: Number of processes searching the root moves for the 'medium' and 'hard' levels.
+        - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+        - cache: Optional PersistentCache. Its table is kept between games instead of the engine's own table.
+        - depth: Optional depth of the search, replacing the depth of the difficulty level, or the largest depth of
+          the search with time_ms.
+        """
+        self.player = player
+        self.difficulty = difficulty
+        self.evaluator = evaluator
+        self.time_ms = time_ms
+        self.workers = workers
+        self.spec = spec
+        self.cache = cache
+        self.depth = depth
+        self._ponder_thread = None
+        self._ponder_stop = None
+        self._pool = None
+        self.new_game()
+
+    def new_game(self):
+        """
+        Forgets the searches of the previous game.
+        """
+        self.stop_pondering()
+        self.transposition_table = search_table(self.difficulty, self.evaluator, self.time_ms, self.cache, self.depth)
+        self.solver = None
+
+    def move(self, grid, stats=None):
+        """
+        Chooses the move of the engine's player.
+        Parameters:
+        - grid: 2D list representing the game board, left unchanged.
+        - stats: Optional SearchStats collecting the statistics of the search.
+        Returns:
+        - Integer representing the column index of the move or -2 if no valid moves are available.
+        """
+        if self.difficulty == 'perfect' and self.time_ms is None and self.depth is None:
+            if self.solver is None:
+                self.solver = Solver(spec=self.spec if self.spec is not None else BoardSpec.for_grid(grid))
+            self.solver.transposition_table.new_search()
+        # The results of pondering belong to this move's search
+        if not self.stop_pondering():
+            self.transposition_table.new_search()
+        if self._pool is None and self.workers > 1 and self.time_ms is None and \
+                (self.depth is not None or self.difficulty in ('medium', 'hard')):
+            self._pool = RootSearchPool(self.workers)
+        return make_ai_move(grid, self.player, self.difficulty, self.transposition_table, self.evaluator,
+                            self.time_ms, self.workers, stats, self.spec, solver=self.solver, depth=self.depth,
+                            pool=self._pool)
+
+    def close(self):
+        """
+        Stops pondering and shuts the processes of the engine down, if any.
+        """
+        self.stop_pondering()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def can_ponder(self):
+        """
+        Returns: Boolean, False for the searches that do not use the engine's table: the 'perfect' level and the
+        searches spread over several processes.
+        """
+        if self.time_ms is not None:
+            return True
+        if self.depth is None and self.difficulty not in DIFFICULTY_DEPTHS:
+            return False
+        return self.workers <= 1 or (self.depth is None and self.difficulty == 'easy')
+
+    def is_pondering(self):
+        """
+        Returns: Boolean, True while the pondering thread is searching.
+        """
+        return self._ponder_thread is not None and self._ponder_thread.is_alive()
+
+    def ponder(self, grid):
+        """
+        Starts searching the replies of the opponent in a background thread, until the next call to move().
+        Parameters:
+        - grid: 2D list representing the game board after the engine's move, the opponent to move. It is copied.
+        """
+        self.stop_pondering()
+        if not self.can_ponder():
+            return
+        spec = self.spec if self.spec is not None else BoardSpec.for_grid(grid)
+        opponent = 'J' if self.player == 'R' else 'R'
+        position = BitboardPosition.from_grid(grid, opponent, spec=spec)
+        if position.is_terminal():
+            return
+
+        # The reply expected by the engine's search first, then the others from the center outwards
+        replies = principal_variation(position, self.transposition_table, 1)[:1]
+        replies += [col for col in spec.center_order if col not in replies and grid[0][col] == ' ']
+        reply_grids = []
+        for col in replies:
+            reply_grid = [row[:] for row in grid]
+            reply_grid[find_empty_row(reply_grid, col)][col] = opponent
+            reply_grids.append(reply_grid)
+
+        self.transposition_table.new_search()
+        self._ponder_stop = SearchStop()
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(reply_grids, spec, self._ponder_stop),
+                                               daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder(self, reply_grids, spec, stop):
+        """
+        Searches the positions after the replies of the opponent into the engine's table, in the pondering thread.
+        Parameters:
+        - reply_grids: Grids after each reply, the engine to move.
+        - spec: BoardSpec of the board.
+        - stop: SearchStop ending the pondering.
+        """
+        depth = self.depth if self.depth is not None else DIFFICULTY_DEPTHS.get(self.difficulty)
+        for reply_grid in reply_grids:
+            if stop.stopped:
+                return
+            if BitboardPosition.from_grid(reply_grid, self.player, spec=spec).check_winner() is None:
+                # Every move of the engine searched with a full window: the search of the move finds its exact score
+                analyze(reply_grid, self.player, depth, transposition_table=self.transposition_table,
+                        evaluator=self.evaluator, spec=spec, deadline=stop)
+
+    def stop_pondering(self):
+        """
+        Stops the pondering thread, if any, and waits for it to end.
+        Returns: Boolean, True if the engine was pondering.
+        """
+        if self._ponder_thread is None:
+            return False
+        self._ponder_stop.stop()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        self._ponder_stop = None
+        return True
@@ -1,8 +1,14 @@
 import time
 import sys
-from Position import Position
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from BitboardPosition import BitboardPosition
 from UtilsPosition import tie, find_empty_row
-from UtilsAiMoves import make_ai_move
+from Engine import Engine
+from PersistentCache import init_worker, worker_cache
+from SearchStats import SearchStats
+from SelfPlay import play_game
+from BoardSpec import STANDARD_SPEC
 from Interface import print_board
 
 # ---------------------------------------------
@@ -13,13 +19,14 @@ from Interface import print_board
 # Player vs Player 
 # -----
 
-def play_player_vs_player(grid, player, cols):
+def play_player_vs_player(grid, player, cols, spec=None):
     """
     Purpose: Facilitates a Player vs Player game mode.
     Parameters:
     - grid: A 2D list representing the game board.
     - player: Initial player ('R' or 'J').
     - cols: Number of columns in the grid.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
     Details: This function enables two human players to take turns placing their respective markers on the game board
     until one of them wins or the game ends in a tie.
     """
@@ -28,12 +35,12 @@ def play_player_vs_player(grid, player, cols):
             print("La partie est un match nul.")
             break
 
-        user_input = input(f"Joueur {player}, choisissez une colonne (0-6) pour placer votre pion: ")
+        user_input = input(f"Joueur {player}, choisissez une colonne (0-{cols - 1}) pour placer votre pion: ")
 
         try:
             col_choice = int(user_input)
         except ValueError:
-            print("Entrée invalide. Veuillez entrer un nombre entre 0 et 6: ")
+            print(f"Entrée invalide. Veuillez entrer un nombre entre 0 et {cols - 1}: ")
             continue
 
         if 0 <= col_choice < cols and grid[0][col_choice] == ' ':
@@ -41,7 +48,7 @@ def play_player_vs_player(grid, player, cols):
             grid[row_insert][col_choice] = player
             print_board(grid)
 
-            position = Position(grid, 'R' if player == 'J' else 'J')
+            position = BitboardPosition.from_grid(grid, 'R' if player == 'J' else 'J', spec=spec)
             if position.check_winner():
                 grid[row_insert][col_choice] = player
                 print_board(grid)
@@ -57,7 +64,7 @@ def play_player_vs_player(grid, player, cols):
 # Player vs AI 
 # -----
 
-def play_player_vs_ai(grid, player, difficulty, cols):
+def play_player_vs_ai(grid, player, difficulty, cols, stats=None, spec=None, cache=None, ponder=True, workers=1):
     """
     Purpose: Facilitates a Player vs AI game mode.
     Parameters:
@@ -65,21 +72,30 @@ def play_player_vs_ai(grid, player, difficulty, cols):
     - player: Initial player ('R' or 'J').
     - difficulty: Difficulty level for the AI ('easy', 'medium', or 'hard').
     - cols: Number of columns in the grid.
+    - stats: Optional SearchStats collecting the statistics of the AI searches.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - cache: Optional PersistentCache of the AI searches, written back at the end of the game.
+    - ponder: Whether the AI searches the replies of the player while waiting for them.
+    - workers: Number of processes searching the moves of the AI for the 'medium' and 'hard' levels, started at
+      its first move and kept for the whole game (the AI does not ponder with several processes).
     Details: This function allows a human player to compete against an AI opponent, with the AI making moves based on
     the specified difficulty level. The game continues until either the human player or the AI wins or the game ends in a tie.
     """
+    engine = Engine('J', difficulty, spec=spec, cache=cache, workers=workers)
+    if ponder and player == 'R':
+        engine.ponder(grid)
     while True:
         if not tie(grid):
             print("La partie est un match nul.")
             break
 
         if player == 'R':
-            user_input = input(f"Joueur {player}, choisissez une colonne (0-6) pour placer votre pion : ")
+            user_input = input(f"Joueur {player}, choisissez une colonne (0-{cols - 1}) pour placer votre pion : ")
 
             try:
                 col_choice = int(user_input)
             except ValueError:
-                print("Entrée invalide. Veuillez entrer un nombre entre 0 et 6 ")
+                print(f"Entrée invalide. Veuillez entrer un nombre entre 0 et {cols - 1} ")
                 continue
 
             if 0 <= col_choice < cols and grid[0][col_choice] == ' ':
@@ -87,7 +103,7 @@ def play_player_vs_ai(grid, player, difficulty, cols):
                 grid[row_insert][col_choice] = player
                 print_board(grid)
 
-                position = Position(grid, 'R' if player == 'J' else 'J')
+                position = BitboardPosition.from_grid(grid, 'R' if player == 'J' else 'J', spec=spec)
                 if position.check_winner():
                     grid[row_insert][col_choice] = player
                     print_board(grid)
@@ -98,7 +114,7 @@ def play_player_vs_ai(grid, player, difficulty, cols):
             else:
                 print("Choix invalide. Veuillez choisir une colonne valide.")
         else:
-            col_choice = make_ai_move(grid, player, difficulty)
+            col_choice = engine.move(grid, stats)
             print(f"L'IA a choisi la colonne {col_choice}")
 
             if col_choice == -2:
@@ -110,7 +126,7 @@ def play_player_vs_ai(grid, player, difficulty, cols):
                 grid[row_insert][col_choice] = player
                 print_board(grid)
 
-                position = Position(grid, 'R' if player == 'J' else 'J')
+                position = BitboardPosition.from_grid(grid, 'R' if player == 'J' else 'J', spec=spec)
                 if position.check_winner():
                     grid[row_insert][col_choice] = player
                     print_board(grid)
@@ -118,15 +134,21 @@ def play_player_vs_ai(grid, player, difficulty, cols):
                     break
 
                 player = 'R'
+                if ponder:
+                    engine.ponder(grid)  # Search the replies while the player thinks
             else:
                 print("L'IA a choisi une colonne invalide. Le jeu continue.")
 
+    engine.close()
+    if cache is not None:
+        cache.flush()
+
 
 # -----
 # AI vs AI 
 # -----
 
-def play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols):
+def play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols, stats=None, spec=None, cache=None, workers=1):
     """
     Function to facilitate an AI vs AI game mode.
     
@@ -136,17 +158,24 @@ def play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols):
     - difficulty_r: Difficulty level for player Rouge's AI ('easy', 'medium', or 'hard').
     - difficulty_j: Difficulty level for player Jaune's AI ('easy', 'medium', or 'hard').
     - cols: Number of columns in the grid.
+    - stats: Optional SearchStats collecting the statistics of the searches of both AIs.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - cache: Optional PersistentCache of the searches of both AIs, written back at the end of the game.
+    - workers: Number of processes searching the moves of each AI for the 'medium' and 'hard' levels, kept for the
+      whole game.
     
     Details: This function enables two AI opponents to play against each other. It alternates between the AI players' turns, making moves based on their specified difficulty levels until one of them wins or the game ends in a tie.
     """
+    engines = {'R': Engine('R', difficulty_r, spec=spec, cache=cache, workers=workers),
+               'J': Engine('J', difficulty_j, spec=spec, cache=cache, workers=workers)}
     while True:
         if player == 'R':
             # Player Rouge's turn
-            col_choice = make_ai_move(grid, player, difficulty_r)
+            col_choice = engines['R'].move(grid, stats)
             print(f"L'IA du joueur Rouge a choisi la colonne {col_choice}")
         else:
             # Player Jaune's turn
-            col_choice = make_ai_move(grid, player, difficulty_j)
+            col_choice = engines['J'].move(grid, stats)
             print(f"L'IA du joueur Jaune a choisi la colonne {col_choice}")
 
         # Check if there are no valid moves left, resulting in a tie
@@ -163,7 +192,7 @@ def play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols):
             # Display the updated game board
             print_board(grid)
 
-            position = Position(grid, 'R' if player == 'J' else 'J')
+            position = BitboardPosition.from_grid(grid, 'R' if player == 'J' else 'J', spec=spec)
             # Check if the current player has won after placing their piece
             if position.check_winner():
                 grid[row_insert][col_choice] = player  # Keep the winning move on the board
@@ -175,11 +204,79 @@ def play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols):
         else:
             print(f"L'IA a choisi une colonne invalide. Le jeu continue.")
 
+    for engine in engines.values():
+        engine.close()
+    if cache is not None:
+        cache.flush()
+
 # ----------------------------------------------------
 # Calculates statistics for multiple AI vs AI matches 
 # ----------------------------------------------------
 
-def play_ai_vs_ai_stats(difficulty1, difficulty2, iterations):
+def print_progress(done, total):
+    """
+    Displays a progress bar on the current line.
+    Parameters:
+    - done: Number of completed iterations.
+    - total: Total number of iterations.
+    """
+    normalized_score = done / total
+    bar_length = 20
+    filled_length = int(normalized_score * bar_length)
+    filled_char = '█'
+    empty_char = '░'
+    progress_bar = filled_char * filled_length + empty_char * (bar_length - filled_length)
+    sys.stdout.write(f'\r Loading : [{progress_bar}] {int(normalized_score * 100)}%')
+    sys.stdout.flush()
+
+
+def play_stats_game(difficulty1, difficulty2, seed, collect_stats=False, spec=STANDARD_SPEC, cache=None):
+    """
+    Plays one silent AI vs AI game for the statistics mode.
+
+    Parameters:
+    - difficulty1: Difficulty level for the first AI, playing 'R' and starting the game.
+    - difficulty2: Difficulty level for the second AI, playing 'J'.
+    - seed: Seed of the random generator for this game, so the game can be replayed.
+    - collect_stats: Whether to collect the statistics of the searches of the game.
+    - spec: BoardSpec of the board.
+    - cache: Optional PersistentCache of the searches of both AIs, written back at the end of the game.
+
+    Returns:
+    - A tuple (winner, duration, stats) with the winning player ('R', 'J' or None for a tie), the game time in
+      seconds and a SearchStats for the game (None if not collected).
+    """
+    random.seed(seed)
+    stats = SearchStats() if collect_stats else None
+    start_time = time.time()
+    # AI 1 plays 'R', AI 2 plays 'J', each keeping its transposition table for the whole game
+    _, winner, _ = play_game(Engine('R', difficulty1, spec=spec, cache=cache),
+                             Engine('J', difficulty2, spec=spec, cache=cache), spec, stats=stats)
+
+    if cache is not None:
+        cache.flush()
+    return winner, time.time() - start_time, stats
+
+
+def play_worker_stats_game(difficulty1, difficulty2, seed, collect_stats=False, spec=STANDARD_SPEC):
+    """
+    Plays one game of the statistics mode in a worker process, with the cache given to its pool by init_worker.
+
+    Parameters:
+    - difficulty1: Difficulty level for the first AI, playing 'R' and starting the game.
+    - difficulty2: Difficulty level for the second AI, playing 'J'.
+    - seed: Seed of the random generator for this game.
+    - collect_stats: Whether to collect the statistics of the searches of the game.
+    - spec: BoardSpec of the board.
+
+    Returns:
+    - The tuple (winner, duration, stats) of play_stats_game.
+    """
+    return play_stats_game(difficulty1, difficulty2, seed, collect_stats, spec, worker_cache())
+
+
+def play_ai_vs_ai_stats(difficulty1, difficulty2, iterations, workers=1, seed=None, stats=None,
+                        spec=STANDARD_SPEC, cache=None):
     """
     Function to play AI vs AI multiple times and calculate statistics.
     
@@ -187,48 +284,47 @@ def play_ai_vs_ai_stats(difficulty1, difficulty2, iterations):
     - difficulty1: Difficulty level for the first AI ('easy', 'medium', or 'hard').
     - difficulty2: Difficulty level for the second AI ('easy', 'medium', or 'hard').
     - iterations: Number of iterations (matches) to play.
+    - workers: Number of processes playing games at the same time (1 plays them in this process).
+    - seed: Optional seed; game i is played with seed + i, so a run can be reproduced with any number of workers.
+    - stats: Optional SearchStats receiving the statistics of the searches of all the games.
+    - spec: BoardSpec of the board.
+    - cache: Optional PersistentCache shared by all the games, each worker process reading and writing the file
+      on its own. The games then depend on the results of the earlier ones, and a seed no longer reproduces them.
     
     Details: This function conducts a specified number of AI vs AI matches, recording the wins for each AI and calculating win ratios. It also measures the total execution time and average time per iteration.
     """
     wins1 = 0
     wins2 = 0
+    if seed is None:
+        seed = random.randrange(2 ** 32)
     start_time = time.time()  # Start the timer
 
-    for i in range(iterations):
-        # Display the progress bar
-        normalized_score = (i+1) / iterations
-        bar_length = 20
-        filled_length = int(normalized_score * bar_length)
-        filled_char = '█'
-        empty_char = '░'
-        progress_bar = filled_char * filled_length + empty_char * (bar_length - filled_length)
-        sys.stdout.write(f'\r Loading : [{progress_bar}] {int(normalized_score * 100)}%')
-        sys.stdout.flush()
-
-        grid = [[' ' for _ in range(7)] for _ in range(6)]  # Initialize the game grid
-        player = 'R'  # Player Rouge starts the game
-
-        while True:
-            if player == 'R':
-                col_choice = make_ai_move(grid, player, difficulty1)  # AI 1's turn
-            else:
-                col_choice = make_ai_move(grid, player, difficulty2)  # AI 2's turn
-
-            if col_choice == -2:
-                break  # No valid moves left, end the game
-
-            row_insert = find_empty_row(grid, col_choice)
-            grid[row_insert][col_choice] = player
-
-            position = Position(grid, 'R' if player == 'J' else 'J')
-            if position.check_winner():
-                if player == 'R':
-                    wins1 += 1
-                else:
-                    wins2 += 1
-                break
-
-            player = 'J' if player == 'R' else 'R'  # Switch player
+    # Display the progress bar
+    print_progress(0, iterations)
+    if workers <= 1:
+        results = (play_stats_game(difficulty1, difficulty2, seed + i, stats is not None, spec, cache)
+                   for i in range(iterations))
+        executor = None
+    else:
+        # Games are streamed back as soon as any worker finishes one. The cache is sent once to every worker,
+        # which warms its tables once for all its games
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache,))
+        futures = [executor.submit(play_worker_stats_game, difficulty1, difficulty2, seed + i, stats is not None, spec)
+                   for i in range(iterations)]
+        results = (future.result() for future in as_completed(futures))
+
+    try:
+        for done, (winner, _, game_stats) in enumerate(results, 1):
+            if game_stats is not None:
+                stats.merge(game_stats)
+            if winner == 'R':
+                wins1 += 1
+            elif winner == 'J':
+                wins2 += 1
+            print_progress(done, iterations)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
     sys.stdout.write('\n')  # Move to a new line after the progress bar
     end_time = time.time()  # Stop the timer
@@ -0,0 +1,417 @@
+import mmap
+import os
+import struct
+from BitboardPosition import BitboardPosition, cell_bit
+from BoardSpec import BoardSpec, STANDARD_SPEC
+
+# -------------------------------------------------------
+# Game records: compact formats for games and positions
+# -------------------------------------------------------
+# - Move strings: a game as the columns played, one character each ('0'-'9' then 'a'-'z'),
+#   as in the self-play files and the tournament results.
+# - Positions: the bitboards of the 'R' and 'J' stones in the BitboardPosition layout, or the
+#   cells packed on 2 bits each (0 empty, 1 'R', 2 'J'), row 0 first as in the grids.
+# - Position files: a header (magic, rows, columns, pieces to align, encoding) followed by
+#   fixed-size position records, memory-mapped so any position is read without reading the
+#   others.
+# - Game files: a header (magic, rows, columns, pieces to align) followed by one record per game:
+#   its number of moves on 2 bytes, then its moves on 4 bits each, two per byte.
+# Writers take any iterable and write it in chunks, readers are generators, so files larger than
+# the memory are streamed.
+
+MOVE_CHARACTERS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+EMPTY_CODE = 0
+RED_CODE = 1
+YELLOW_CODE = 2
+CELL_CODES = {' ': EMPTY_CODE, 'R': RED_CODE, 'J': YELLOW_CODE}
+CELL_CHARACTERS = ' RJ'
+
+POSITION_MAGIC = b'C4PO'
+GAME_MAGIC = b'C4GM'
+POSITION_HEADER = struct.Struct('<4sBBBB')
+GAME_HEADER = struct.Struct('<4sBBB')
+GAME_LENGTH = struct.Struct('<H')
+
+# Encodings of the position records
+BITBOARDS = 0
+PACKED = 1
+
+# Records written at once
+WRITE_CHUNK = 4096
+
+# Moves are stored on 4 bits in game files
+MAX_GAME_COLUMNS = 16
+
+
+def encode_moves(moves):
+    """
+    Writes a list of columns as a move string.
+    Parameters:
+    - moves: List of column indices.
+    Returns: String with one character per move.
+    """
+    return ''.join(MOVE_CHARACTERS[col] for col in moves)
+
+
+def decode_moves(text):
+    """
+    Reads a move string.
+    Parameters:
+    - text: String written by encode_moves.
+    Returns: List of column indices.
+    """
+    return [MOVE_CHARACTERS.index(character) for character in text]
+
+
+def replay(moves, spec=STANDARD_SPEC):
+    """
+    Plays a game from the empty board, 'R' first.
+    Parameters:
+    - moves: List of column indices, or a move string.
+    - spec: BoardSpec of the board.
+    Returns: BitboardPosition after the moves, whose check_winner() gives the result of the game.
+    """
+    if isinstance(moves, str):
+        moves = decode_moves(moves)
+    position = BitboardPosition(0, 0, 0, 'R', spec=spec)
+    for index, col in enumerate(moves):
+        if position.check_winner() is not None or not 0 <= col < spec.cols or position.mask & spec.top_masks[col]:
+            raise ValueError(f"Coup invalide : colonne {col} au coup {index + 1}")
+        position.push(col)
+    return position
+
+
+def moves_to_grid(moves, spec=STANDARD_SPEC):
+    """
+    Builds the grid of a game.
+    Parameters:
+    - moves: List of column indices, or a move string.
+    - spec: BoardSpec of the board.
+    Returns: 2D list representing the game board after the moves.
+    """
+    return replay(moves, spec).to_grid()
+
+
+def grid_to_bitboards(grid, spec=None):
+    """
+    Converts a grid into bitboards.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    Returns: Tuple (red, yellow) of the bitboards of the 'R' and 'J' stones, in the BitboardPosition layout.
+    """
+    if spec is None:
+        spec = BoardSpec.for_grid(grid)
+    red = yellow = 0
+    for row in range(spec.rows):
+        for col in range(spec.cols):
+            if grid[row][col] == 'R':
+                red |= 1 << cell_bit(row, col, spec)
+            elif grid[row][col] == 'J':
+                yellow |= 1 << cell_bit(row, col, spec)
+    return red, yellow
+
+
+def bitboards_to_grid(red, yellow, spec=STANDARD_SPEC):
+    """
+    Converts bitboards into a grid.
+    Parameters:
+    - red: Bitboard of the 'R' stones.
+    - yellow: Bitboard of the 'J' stones.
+    - spec: BoardSpec of the board.
+    Returns: 2D list representing the game board.
+    """
+    grid = spec.empty_grid()
+    for row in range(spec.rows):
+        for col in range(spec.cols):
+            bit = cell_bit(row, col, spec)
+            if red >> bit & 1:
+                grid[row][col] = 'R'
+            elif yellow >> bit & 1:
+                grid[row][col] = 'J'
+    return grid
+
+
+def position_to_bitboards(position):
+    """
+    Reads the stones of a position or a grid.
+    Parameters:
+    - position: BitboardPosition, Position or grid.
+    Returns: Tuple (red, yellow) of bitboards.
+    """
+    if isinstance(position, BitboardPosition):
+        red = position.red_stones()
+        return red, red ^ position.mask
+    if isinstance(position, list):
+        return grid_to_bitboards(position)
+    return grid_to_bitboards(position.grid, position.spec)
+
+
+def pack_grid(grid):
+    """
+    Packs a grid on 2 bits per cell.
+    Parameters:
+    - grid: 2D list representing the game board.
+    Returns: Bytes, (rows * cols + 3) // 4 of them.
+    """
+    value = 0
+    shift = 0
+    for row in grid:
+        for cell in row:
+            value |= CELL_CODES[cell] << shift
+            shift += 2
+    return value.to_bytes((shift + 7) // 8, 'little')
+
+
+def unpack_grid(data, spec=STANDARD_SPEC):
+    """
+    Unpacks a grid packed by pack_grid.
+    Parameters:
+    - data: Bytes of the packed grid.
+    - spec: BoardSpec of the board.
+    Returns: 2D list representing the game board.
+    """
+    value = int.from_bytes(data, 'little')
+    grid = []
+    for _ in range(spec.rows):
+        row = []
+        for _ in range(spec.cols):
+            row.append(CELL_CHARACTERS[value & 3])
+            value >>= 2
+        grid.append(row)
+    return grid
+
+
+def bitboard_bytes(spec):
+    """
+    Returns: Number of bytes of a bitboard of the board in a position record.
+    """
+    return (spec.h1 * spec.cols + 7) // 8
+
+
+def position_record_size(spec, encoding=BITBOARDS):
+    """
+    Returns: Number of bytes of a position record of the board with an encoding.
+    """
+    if encoding == PACKED:
+        return (spec.cells + 3) // 4
+    return 2 * bitboard_bytes(spec)
+
+
+def write_positions(path, positions, spec=STANDARD_SPEC, encoding=BITBOARDS):
+    """
+    Writes positions to a position file.
+    Parameters:
+    - path: Path of the file to write.
+    - positions: Iterable of grids, Position or BitboardPosition objects, or (red, yellow) bitboard pairs.
+    - spec: BoardSpec of the positions.
+    - encoding: BITBOARDS (bitboard pairs) or PACKED (2 bits per cell, smaller on the standard board).
+    Returns: Number of positions written.
+    """
+    size = bitboard_bytes(spec)
+    count = 0
+    with open(path, 'wb') as positions_file:
+        positions_file.write(POSITION_HEADER.pack(POSITION_MAGIC, spec.rows, spec.cols, spec.connect, encoding))
+        chunk = []
+        for position in positions:
+            red, yellow = position if isinstance(position, tuple) else position_to_bitboards(position)
+            if encoding == PACKED:
+                chunk.append(pack_grid(bitboards_to_grid(red, yellow, spec)))
+            else:
+                chunk.append(red.to_bytes(size, 'little') + yellow.to_bytes(size, 'little'))
+            if len(chunk) == WRITE_CHUNK:
+                positions_file.write(b''.join(chunk))
+                count += len(chunk)
+                chunk = []
+        positions_file.write(b''.join(chunk))
+        count += len(chunk)
+    return count
+
+
+class PositionFile:
+    """
+    Read-only access to a position file. The file is memory-mapped on first use: positions are read by index
+    without reading the rest of the file, and iterating streams them in order.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the reader without opening the file.
+        Parameters:
+        - path: Path of the position file.
+        """
+        self.path = path
+        self.spec = None
+        self.encoding = None
+        self.record_size = 0
+        self.count = 0
+        self._data = None
+
+    def _load(self):
+        """
+        Memory-maps the file and reads its header.
+        """
+        with open(self.path, 'rb') as positions_file:
+            data = mmap.mmap(positions_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, cols, connect, encoding = POSITION_HEADER.unpack_from(data, 0)
+        if magic != POSITION_MAGIC:
+            data.close()
+            raise ValueError(f"{self.path} n'est pas un fichier de positions")
+        self.spec = BoardSpec.of(rows, cols, connect)
+        self.encoding = encoding
+        self.record_size = position_record_size(self.spec, encoding)
+        self.count = (len(data) - POSITION_HEADER.size) // self.record_size
+        self._data = data
+
+    def _ensure_loaded(self):
+        if self._data is None:
+            self._load()
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return self.count
+
+    def _record(self, index):
+        """
+        Returns the bytes of a record.
+        Parameters:
+        - index: Index of the position, negative indices counting from the end.
+        Returns: Bytes of the record.
+        """
+        self._ensure_loaded()
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"Position {index} absente de {self.path} ({self.count} positions)")
+        offset = POSITION_HEADER.size + index * self.record_size
+        return self._data[offset:offset + self.record_size]
+
+    def _decode_bitboards(self, record):
+        if self.encoding == PACKED:
+            return grid_to_bitboards(unpack_grid(record, self.spec), self.spec)
+        size = self.record_size // 2
+        return int.from_bytes(record[:size], 'little'), int.from_bytes(record[size:], 'little')
+
+    def _decode_grid(self, record):
+        if self.encoding == PACKED:
+            return unpack_grid(record, self.spec)
+        return bitboards_to_grid(*self._decode_bitboards(record), self.spec)
+
+    def bitboards(self, index):
+        """
+        Reads a position as bitboards.
+        Parameters:
+        - index: Index of the position.
+        Returns: Tuple (red, yellow) of bitboards.
+        """
+        return self._decode_bitboards(self._record(index))
+
+    def __getitem__(self, index):
+        """
+        Reads a position as a grid.
+        Parameters:
+        - index: Index of the position.
+        Returns: 2D list representing the game board.
+        """
+        return self._decode_grid(self._record(index))
+
+    def iter_bitboards(self):
+        """
+        Streams the positions as bitboards.
+        Returns: Iterator over (red, yellow) tuples.
+        """
+        for index in range(len(self)):
+            yield self._decode_bitboards(self._record(index))
+
+    def __iter__(self):
+        """
+        Streams the positions as grids.
+        Returns: Iterator over 2D lists.
+        """
+        for index in range(len(self)):
+            yield self._decode_grid(self._record(index))
+
+
+def write_game_file(path, games, spec=STANDARD_SPEC):
+    """
+    Writes games to a game file.
+    Parameters:
+    - path: Path of the file to write.
+    - games: Iterable of games, each a list of column indices or a move string.
+    - spec: BoardSpec of the games, with at most 16 columns.
+    Returns: Number of games written.
+    """
+    if spec.cols > MAX_GAME_COLUMNS:
+        raise ValueError(f"Les fichiers de parties sont limités à {MAX_GAME_COLUMNS} colonnes")
+    count = 0
+    with open(path, 'wb') as games_file:
+        games_file.write(GAME_HEADER.pack(GAME_MAGIC, spec.rows, spec.cols, spec.connect))
+        chunk = []
+        for moves in games:
+            if isinstance(moves, str):
+                moves = decode_moves(moves)
+            packed = bytes(moves[i] | (moves[i + 1] << 4 if i + 1 < len(moves) else 0)
+                           for i in range(0, len(moves), 2))
+            chunk.append(GAME_LENGTH.pack(len(moves)) + packed)
+            if len(chunk) == WRITE_CHUNK:
+                games_file.write(b''.join(chunk))
+                count += len(chunk)
+                chunk = []
+        games_file.write(b''.join(chunk))
+        count += len(chunk)
+    return count
+
+
+def read_game_file_spec(path):
+    """
+    Reads the board of a game file.
+    Parameters:
+    - path: Path of the game file.
+    Returns: BoardSpec of the games.
+    """
+    with open(path, 'rb') as games_file:
+        magic, rows, cols, connect = GAME_HEADER.unpack(games_file.read(GAME_HEADER.size))
+    if magic != GAME_MAGIC:
+        raise ValueError(f"{path} n'est pas un fichier de parties")
+    return BoardSpec.of(rows, cols, connect)
+
+
+def read_game_file(path):
+    """
+    Streams the games of a game file from a memory map.
+    Parameters:
+    - path: Path of the game file.
+    Returns: Iterator over the games, each a list of column indices.
+    """
+    read_game_file_spec(path)
+    if os.path.getsize(path) == GAME_HEADER.size:
+        return
+    with open(path, 'rb') as games_file:
+        with mmap.mmap(games_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = GAME_HEADER.size
+            end = len(data)
+            while offset < end:
+                (length,) = GAME_LENGTH.unpack_from(data, offset)
+                offset += GAME_LENGTH.size
+                size = (length + 1) // 2
+                moves = []
+                for byte in data[offset:offset + size]:
+                    moves.append(byte & 15)
+                    moves.append(byte >> 4)
+                offset += size
+                yield moves[:length]
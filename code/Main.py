@@ -1,20 +1,46 @@
+import argparse
 from Interface import print_board
 from GameMode import play_player_vs_player, play_player_vs_ai, play_ai_vs_ai, play_ai_vs_ai_stats
 from UtilsAiMoves import get_valid_difficulty
+from SearchStats import SearchStats
+from BoardSpec import BoardSpec, STANDARD_SPEC
+from PersistentCache import PersistentCache
 
 # ------------------------------------------------------------
 # Main function 
 # ------------------------------------------------------------
-def play_connect_four():
+def report_stats(stats, stats_json=None):
+    """
+    Prints the search statistics collected during a game mode and optionally writes them to a JSON file.
+    Parameters:
+    - stats: SearchStats collected, or None if statistics are disabled.
+    - stats_json: Optional path of the JSON file to write.
+    """
+    if stats is None:
+        return
+    stats.report()
+    if stats_json:
+        stats.to_json(stats_json)
+        print(f"Statistiques de recherche enregistrées dans {stats_json}")
+
+
+def play_connect_four(show_stats=False, stats_json=None, spec=STANDARD_SPEC, cache_path=None, ponder=True, workers=1):
     """
     Main function to play Connect Four.
+    Parameters:
+    - show_stats: Whether to collect and print the search statistics of the AI after each game mode.
+    - stats_json: Optional path of a JSON file receiving the search statistics (implies show_stats).
+    - spec: BoardSpec of the board to play on.
+    - cache_path: Optional path of the file of the PersistentCache keeping the AI search results between runs.
+    - ponder: Whether the AI searches the replies of the player while waiting for them in Player vs AI mode.
+    - workers: Number of processes searching each move of the AI in Player vs AI and AI vs AI modes.
     """
     fin = True  # Boolean flag to control the game loop
 
     # Initialize game parameters
-    rows = 6
-    cols = 7
-    grid = [[' ' for _ in range(cols)] for _ in range(rows)]
+    cols = spec.cols
+    cache = PersistentCache(cache_path, spec) if cache_path else None
+    grid = spec.empty_grid()
     player = 'R'
 
     print("Bienvenue dans Puissance 4 !")  # Print welcome message
@@ -29,39 +55,53 @@ def play_connect_four():
                 except ValueError:
                     print("Veuillez entrer un nombre valide.")  # Handle invalid input
 
+            # A new collector for every game mode, so each report covers one run
+            stats = SearchStats() if show_stats or stats_json else None
+
             if game_mode == 1:
                 # Player vs Player mode
                 print_board(grid)  # Display the initial game board
-                play_player_vs_player(grid, player, cols)  # Call function to play PvP
-                grid = [[' ' for _ in range(cols)] for _ in range(rows)]  # Reset the game grid
+                play_player_vs_player(grid, player, cols, spec)  # Call function to play PvP
+                grid = spec.empty_grid()  # Reset the game grid
             elif game_mode == 2:
                 # Player vs AI mode
                 print_board(grid)  # Display the initial game board
                 difficulty = get_valid_difficulty(
-                    "Choisissez le niveau de difficulté pour l'IA (easy, medium, hard) : ")
-                play_player_vs_ai(grid, player, difficulty, cols)  # Call function to play PvAI
-                grid = [[' ' for _ in range(cols)] for _ in range(rows)]  # Reset the game grid
+                    "Choisissez le niveau de difficulté pour l'IA (easy, medium, hard, perfect) : ", spec)
+                play_player_vs_ai(grid, player, difficulty, cols, stats, spec, cache, ponder, workers)  # Call function to play PvAI
+                report_stats(stats, stats_json)
+                grid = spec.empty_grid()  # Reset the game grid
             elif game_mode == 3:
                 # AI vs AI mode
                 difficulty_r = get_valid_difficulty(
-                    "Choisissez le niveau de difficulté pour l'IA du joueur Rouge (easy, medium, hard) : ")
+                    "Choisissez le niveau de difficulté pour l'IA du joueur Rouge (easy, medium, hard, perfect) : ", spec)
                 difficulty_j = get_valid_difficulty(
-                    "Choisissez le niveau de difficulté pour l'IA du joueur Jaune (easy, medium, hard) : ")
-                play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols)  # Call function to play AiVAi
-                grid = [[' ' for _ in range(cols)] for _ in range(rows)]  # Reset the game grid
+                    "Choisissez le niveau de difficulté pour l'IA du joueur Jaune (easy, medium, hard, perfect) : ", spec)
+                play_ai_vs_ai(grid, player, difficulty_r, difficulty_j, cols, stats, spec, cache, workers)  # Call function to play AiVAi
+                report_stats(stats, stats_json)
+                grid = spec.empty_grid()  # Reset the game grid
             elif game_mode == 4:
                 # Stats mode
                 difficulty1 = get_valid_difficulty(
-                    "Choisissez le niveau de difficulté pour le premier IA (easy, medium, hard) : ")
+                    "Choisissez le niveau de difficulté pour le premier IA (easy, medium, hard, perfect) : ", spec)
                 difficulty2 = get_valid_difficulty(
-                    "Choisissez le niveau de difficulté pour le deuxième IA (easy, medium, hard) : ")
+                    "Choisissez le niveau de difficulté pour le deuxième IA (easy, medium, hard, perfect) : ", spec)
                 while True:
                     try:
                         iterations = int(input("Entrez le nombre d'itérations à exécuter : "))
                         break  # Exit loop if input is valid
                     except ValueError:
                         print("Veuillez entrer un nombre valide pour les itérations.")
-                play_ai_vs_ai_stats(difficulty1, difficulty2, iterations)
+                while True:
+                    try:
+                        game_workers = input("Entrez le nombre de processus à utiliser (Entrée pour 1) : ")
+                        game_workers = int(game_workers) if game_workers.strip() else 1
+                        break  # Exit loop if input is valid
+                    except ValueError:
+                        print("Veuillez entrer un nombre valide de processus.")
+                play_ai_vs_ai_stats(difficulty1, difficulty2, iterations, game_workers, stats=stats, spec=spec,
+                                    cache=cache)
+                report_stats(stats, stats_json)
             elif game_mode == 5:
                 # Exit the game
                 fin = False  # Set the flag to exit the game loop
@@ -71,7 +111,32 @@ def play_connect_four():
         except Exception as e:
             print(f"Une erreur inattendue est survenue : {e}")
 
+    if cache is not None:
+        cache.close()
     print("Fin du jeu.")  # Print end of game message
 
 if __name__ == "__main__":
-    play_connect_four()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Puissance 4")
+    parser.add_argument('--stats', action='store_true',
+                        help="affiche les statistiques de recherche de l'IA après chaque partie")
+    parser.add_argument('--stats-json', metavar='FICHIER',
+                        help="enregistre les statistiques de recherche de l'IA dans un fichier JSON")
+    parser.add_argument('--rows', type=int, default=6, help="nombre de lignes de la grille (6 par défaut)")
+    parser.add_argument('--cols', type=int, default=7, help="nombre de colonnes de la grille (7 par défaut)")
+    parser.add_argument('--connect', type=int, default=4,
+                        help="nombre de pions à aligner pour gagner (4 par défaut)")
+    parser.add_argument('--cache', metavar='FICHIER',
+                        help="conserve les résultats de recherche de l'IA d'une exécution à l'autre dans ce fichier")
+    parser.add_argument('--no-ponder', action='store_true',
+                        help="l'IA ne réfléchit pas pendant que le joueur choisit son coup")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="nombre de processus cherchant chaque coup de l'IA en modes Joueur vs IA et IA vs IA "
+                             "(1 par défaut)")
+    args = parser.parse_args()
+    try:
+        board_spec = BoardSpec.of(args.rows, args.cols, args.connect)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.workers < 1:
+        parser.error("--workers doit être au moins 1")
+    play_connect_four(args.stats, args.stats_json, board_spec, args.cache, not args.no_ponder, args.workers)
\ No newline at end of file
@@ -0,0 +1,99 @@
+# -------------------------------------------------------
+# Move ordering: which children the search tries first
+# -------------------------------------------------------
+# Alpha-beta prunes the most when the best move is searched first. Moves are tried in this order:
+# - the best move stored in the transposition table for the position,
+# - the most urgent moves, by the longest line of either player through the landing cell
+#   (position.move_priority), so extending a line and blocking one come first for both players,
+# - among equally urgent moves, the killer moves of the ply, moves that recently produced a beta
+#   cutoff in a sibling position,
+# - then the moves with the highest history score, the total of the cutoffs each move produced for
+#   the player to move, weighted by the depth of the search,
+# - and the center columns first among equal moves, since they belong to the most alignments.
+# Killers and history rank below the static priority: used on their own they order the moves worse
+# than the static priority does.
+
+from BoardSpec import STANDARD_SPEC
+
+# Number of killer moves remembered per ply
+KILLER_SLOTS = 2
+
+# History scores are halved once one of them reaches this value, so old cutoffs fade out
+HISTORY_LIMIT = 1 << 20
+
+# Sort keys are packed in one integer: TT move bonus > priority << PRIORITY_SHIFT > killer bonus > history
+PRIORITY_SHIFT = 40
+KILLER_BONUS = 1 << 39
+TT_MOVE_BONUS = 1 << 48
+
+
+class MoveOrdering:
+    """
+    Keeps the killer moves and the history table of a search and orders the moves of its positions.
+    The same object is shared by every node of a search, and can be kept between the iterations of
+    iterative deepening, where it carries what the shallower searches learned.
+    """
+
+    def __init__(self, spec=STANDARD_SPEC):
+        """
+        Initializes empty killer and history tables.
+        Parameters:
+        - spec: BoardSpec of the board. The killers are indexed by the number of pieces played, up to its cells.
+        """
+        self.width = spec.cols
+        self.columns = spec.center_order
+        self.killers = [[None] * KILLER_SLOTS for _ in range(spec.cells + 1)]
+        self.history = {'R': [0] * spec.cols, 'J': [0] * spec.cols}
+
+    def clear(self):
+        """
+        Forgets the killer moves and the history scores.
+        """
+        for killers in self.killers:
+            killers[:] = [None] * KILLER_SLOTS
+        for scores in self.history.values():
+            scores[:] = [0] * self.width
+
+    def order(self, position, best_move=None, moves=None):
+        """
+        Orders the playable moves of a position.
+        Parameters:
+        - position: An instance of Position or BitboardPosition.
+        - best_move: Optional column to try first, the best move stored in the transposition table.
+        - moves: Optional columns to order, all the playable columns if not given.
+        Returns: List of column indices.
+        """
+        playable = moves if moves is not None else position.generate_moves()
+        moves = [col for col in self.columns if col in playable]
+        history = self.history[position.current_player]
+        scores = [0] * self.width
+        for col in moves:
+            scores[col] = (position.move_priority(col) << PRIORITY_SHIFT) + history[col]
+        killers = self.killers[position.moves]
+        for slot, killer in enumerate(killers):
+            if killer in moves:
+                scores[killer] += KILLER_BONUS >> slot
+        if best_move in moves:
+            scores[best_move] += TT_MOVE_BONUS
+        # Stable sort: the center-first order is kept among equal scores
+        moves.sort(key=lambda col: -scores[col])
+        return moves
+
+    def record_cutoff(self, position, move, depth):
+        """
+        Rewards a move that produced a beta cutoff.
+        Parameters:
+        - position: Position where the cutoff happened, before the move is played.
+        - move: Column of the move producing the cutoff.
+        - depth: Remaining depth of the search at the position, deeper cutoffs count more.
+        """
+        killers = self.killers[position.moves]
+        if killers[0] != move:
+            killers[1:] = killers[:-1]
+            killers[0] = move
+
+        scores = self.history[position.current_player]
+        scores[move] += depth * depth
+        if scores[move] >= HISTORY_LIMIT:
+            for player_scores in self.history.values():
+                player_scores[:] = [score >> 1 for score in player_scores]
@@ -0,0 +1,215 @@
+import os
+import sqlite3
+from BoardSpec import STANDARD_SPEC
+from TranspositionTable import TranspositionTable
+
+# -------------------------------------------------------
+# Persistent cache: search results kept on disk between runs
+# -------------------------------------------------------
+# The transposition table only lives as long as one search. The cache stores its deepest entries in
+# an SQLite file, so the positions met again in later games and later runs (the openings mostly)
+# are not searched again. Tables are warmed from the file when first used and their new entries
+# are written back with flush(), typically at the end of a game.
+# The file is in WAL mode: any number of processes can read it while one of them writes, and
+# concurrent writers wait for each other, so the worker processes of the statistics mode can all
+# use the same file. Each process opens its own connection: a pool of processes gets the cache
+# once per process through init_worker, so every process warms its tables once for all its games.
+# Results depend on the board and on the evaluator, both are part of the key of a record.
+
+# Entries searched less deeply are cheap to search again and are not written to the file
+MIN_DEPTH = 3
+
+# Seconds a writer waits for another process to finish writing
+BUSY_TIMEOUT = 30
+
+# Cache of the current worker process, given by init_worker
+_worker_cache = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    board TEXT NOT NULL,
+    key NOT NULL,
+    depth INTEGER NOT NULL,
+    score NOT NULL,
+    flag INTEGER NOT NULL,
+    best_move INTEGER,
+    PRIMARY KEY (board, key)
+) WITHOUT ROWID
+"""
+
+# A record only replaces a record of the same position searched at most as deeply
+UPSERT = """
+INSERT INTO positions (board, key, depth, score, flag, best_move) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (board, key) DO UPDATE SET
+    depth = excluded.depth, score = excluded.score, flag = excluded.flag, best_move = excluded.best_move
+WHERE excluded.depth >= positions.depth
+"""
+
+
+class PersistentCache:
+    """
+    Transposition tables warmed from an SQLite file and written back to it.
+    table() returns one table per evaluator and maximum depth, kept for the life of the cache so it is
+    shared by all the moves of the games using the cache.
+    """
+
+    def __init__(self, path, spec=STANDARD_SPEC, min_depth=MIN_DEPTH, size_mb=16):
+        """
+        Initializes the cache without opening the file.
+        Parameters:
+        - path: Path of the SQLite file, created if missing.
+        - spec: BoardSpec of the positions searched with the cache.
+        - min_depth: Smallest search depth of the entries written to the file.
+        - size_mb: Memory budget of each transposition table.
+        """
+        self.path = path
+        self.spec = spec
+        self.min_depth = min_depth
+        self.size_mb = size_mb
+        self.tables = {}
+        # Depth on disk of the positions held by the tables, by board name
+        self._known = {}
+        self._connection = None
+        self._pid = None
+        # Position keys longer than an SQLite integer are stored as text
+        self._text_keys = spec.h1 * spec.cols + 1 > 63
+
+    def __reduce__(self):
+        # Sent to other processes as its parameters, each process opens its own connection and tables
+        return PersistentCache, (self.path, self.spec, self.min_depth, self.size_mb)
+
+    def connection(self):
+        """
+        Opens the file on first use in the current process.
+        Returns: sqlite3.Connection to the file.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            with self._connection:
+                self._connection.execute(SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """
+        Closes the connection of the current process, the tables are kept.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        self.close()
+
+    def board_name(self, evaluator):
+        """
+        Names the records of a board and an evaluator in the file.
+        Parameters:
+        - evaluator: Heuristic used by the search, 'classic' or 'windows'.
+        Returns: String such as '6x7x4/classic'.
+        """
+        return f"{self.spec.rows}x{self.spec.cols}x{self.spec.connect}/{evaluator}"
+
+    def table(self, max_depth=None, evaluator='classic'):
+        """
+        Returns the transposition table of an evaluator, warmed from the file on first use.
+        Parameters:
+        - max_depth: Optional largest depth of the entries read from the file. A search of depth d warmed with
+          max_depth=d plays as if it had searched every position itself, deeper entries would make it stronger.
+        - evaluator: Heuristic used by the searches using the table.
+        Returns: TranspositionTable object.
+        """
+        if (evaluator, max_depth) not in self.tables:
+            transposition_table = TranspositionTable(self.size_mb)
+            self.warm(transposition_table, max_depth, evaluator)
+            self.tables[(evaluator, max_depth)] = transposition_table
+        return self.tables[(evaluator, max_depth)]
+
+    def warm(self, transposition_table, max_depth=None, evaluator='classic'):
+        """
+        Loads the records of the file into a transposition table, the deepest ones last so they take the
+        depth-preferred slots.
+        Parameters:
+        - transposition_table: TranspositionTable to fill.
+        - max_depth: Optional largest depth of the records loaded.
+        - evaluator: Heuristic of the records loaded.
+        Returns: Number of records loaded.
+        """
+        board = self.board_name(evaluator)
+        known = self._known.setdefault(board, {})
+        query = "SELECT key, depth, score, flag, best_move FROM positions WHERE board = ?"
+        parameters = [board]
+        if max_depth is not None:
+            query += " AND depth <= ?"
+            parameters.append(max_depth)
+        count = 0
+        for key, depth, score, flag, best_move in self.connection().execute(query + " ORDER BY depth", parameters):
+            transposition_table.store(int(key), depth, score, flag, best_move)
+            count += 1
+        # Only the records kept by the table are remembered, not every record of the file
+        known.update((key, depth) for key, depth, _, _, _ in transposition_table)
+        return count
+
+    def write_back(self, transposition_table, evaluator='classic'):
+        """
+        Writes the entries of a transposition table to the file, skipping the shallow ones and those the file
+        already holds at the same depth or deeper.
+        Parameters:
+        - transposition_table: TranspositionTable to save.
+        - evaluator: Heuristic used by the searches that filled the table.
+        Returns: Number of records written.
+        """
+        board = self.board_name(evaluator)
+        known = self._known.get(board, {})
+        records = [(board, str(key) if self._text_keys else key, depth, score, flag, best_move)
+                   for key, depth, score, flag, best_move in transposition_table
+                   if depth >= self.min_depth and depth > known.get(key, -1)]
+        # The positions replaced in the table are forgotten, so the known depths never outnumber its entries
+        self._known[board] = {key: max(depth, known.get(key, -1)) for key, depth, _, _, _ in transposition_table}
+        if not records:
+            return 0
+        connection = self.connection()
+        changes = connection.total_changes
+        with connection:
+            connection.executemany(UPSERT, records)
+        # Records of positions another process saved deeper in the meantime are not written
+        return connection.total_changes - changes
+
+    def flush(self):
+        """
+        Writes the new entries of every table returned by table() to the file.
+        Returns: Number of records written.
+        """
+        return sum(self.write_back(transposition_table, evaluator)
+                   for (evaluator, _), transposition_table in self.tables.items())
+
+    def __len__(self):
+        """
+        Returns: Number of records of the board in the file, all evaluators included.
+        """
+        return self.connection().execute("SELECT COUNT(*) FROM positions WHERE board LIKE ?",
+                                         (self.board_name('%'),)).fetchone()[0]
+
+
+def init_worker(cache):
+    """
+    Initializer of a pool of processes sharing a cache: the cache is sent once to every process, which keeps its
+    tables for all the games it plays.
+    Parameters:
+    - cache: PersistentCache of the pool, or None.
+    """
+    global _worker_cache
+    _worker_cache = cache
+
+
+def worker_cache():
+    """
+    Returns: PersistentCache given to the current process by init_worker, None if there is none.
+    """
+    return _worker_cache
@@ -1,4 +1,9 @@
-from UtilsPosition import count_consecutive_vertical, count_consecutive_horizontal, count_consecutive_diagonal_right, count_consecutive_diagonal_left , find_empty_row
+from UtilsPosition import longest_line, has_line, find_empty_row
+from WindowScore import WindowScore
+from BoardSpec import BoardSpec
+
+# Marker for a winner that has not been computed yet (None means no winner)
+_UNKNOWN = object()
 
 # -------------------------------------------------------
 # Class Definition: Position Class for handling the game state
@@ -10,26 +15,61 @@ class Position:
     Represents the current state of the game.
     """
 
-    def __init__(self, grid, current_player):
+    def __init__(self, grid, current_player, last_move=None, evaluator='classic', window_score=None, spec=None):
         """
         Initializes the position of the grid and the current player.
         Parameters:
         - grid: 2D list representing the game board.
         - current_player: Character representing the current player.
+        - last_move: Optional (row, col) tuple of the last piece played. When given, the grid before that move
+          is assumed to have no winner, so only the lines through this cell are checked for a win.
+        - evaluator: Heuristic used by evaluate(), 'classic' (longest runs) or 'windows' (incremental window score).
+        - window_score: Optional WindowScore already matching the grid, passed on by play().
+        - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
         """
+        self.spec = spec if spec is not None else BoardSpec.for_grid(grid)
         self.grid = [row[:] for row in grid]
         self.current_player = current_player
+        self.last_move = last_move
+        self._winner = _UNKNOWN
+        self.evaluator = evaluator
+        if evaluator == 'windows' and window_score is None:
+            window_score = WindowScore.from_grid(self.grid, self.spec)
+        self.window_score = window_score
+        # Moves made with push(), with what is needed to take them back
+        self.history = []
+        # Zobrist hash of the grid and player to move, and of its mirror image, updated by push() and pop()
+        zobrist_keys = self.spec.zobrist_keys
+        last_col = self.spec.cols - 1
+        self.hash = self.spec.zobrist_side if current_player == 'J' else 0
+        self.mirror_hash = self.hash
+        # Number of pieces on the board
+        self.moves = 0
+        for row in range(len(self.grid)):
+            for col in range(len(self.grid[0])):
+                if self.grid[row][col] in zobrist_keys:
+                    self.hash ^= zobrist_keys[self.grid[row][col]][row][col]
+                    self.mirror_hash ^= zobrist_keys[self.grid[row][col]][row][last_col - col]
+                    self.moves += 1
 
     def is_terminal(self):
         """
         Determines if the current game state is terminal (i.e., game over).
         Returns: Boolean indicating if the game has ended.
         """
-        return self.check_winner() or all(cell != ' ' for row in self.grid for cell in row)
+        return self.check_winner() is not None or self.is_full()
+
+    def is_full(self):
+        """
+        Determines if the grid is full. Pieces fall to the bottom, so only the top row needs to be checked.
+        Returns: Boolean indicating if no more pieces can be played.
+        """
+        return all(cell != ' ' for cell in self.grid[0])
 
     def evaluate(self):
         """
         Evaluates the game state from the perspective of the 'R' player.
+        With the 'windows' evaluator the heuristic part is the running window score, read in constant time.
         Returns: Integer score indicating the state's favorability towards 'R'.
         """
         # Positive score for favorable positions for 'R', negative for 'J'
@@ -38,9 +78,12 @@ class Position:
             return 1000  # AI ('R') wins
         elif winner == 'J':
             return -1000  # Opponent ('J') wins
-        elif self.is_terminal():
+        elif self.is_full():
             return 0
 
+        if self.window_score is not None:
+            return self.window_score.score
+
         score = 0
         for row in range(len(self.grid)):
             for col in range(len(self.grid[0])):
@@ -59,14 +102,86 @@ class Position:
         - col: Column index of the position.
         Returns: Integer score based on proximity to a winning condition.
         """
-        proximity_score = 0
-        vertical_score = count_consecutive_vertical(self.grid, 'R', row, col)
-        horizontal_score = count_consecutive_horizontal(self.grid, 'R', row, col)
-        diagonal_score_right = count_consecutive_diagonal_right(self.grid, 'R', row, col)
-        diagonal_score_left = count_consecutive_diagonal_left(self.grid, 'R', row, col)
         # Prioritize higher consecutive counts
-        proximity_score += max(diagonal_score_right, diagonal_score_left, vertical_score, horizontal_score) ** 2
-        return proximity_score
+        return longest_line(self.grid, 'R', self.spec.cell_rays[row][col]) ** 2
+
+    def evaluate_move(self, move):
+        """
+        Evaluates the cell where a piece dropped in the given column would land, used for move ordering.
+        Parameters:
+        - move: Column index of a playable column.
+        Returns: Integer score of the landing cell.
+        """
+        return self.evaluate_position(find_empty_row(self.grid, move), move)
+
+    def move_priority(self, move):
+        """
+        Measures how urgent a move is, used for move ordering: the longest line through the landing cell,
+        made of the pieces of the player to move (extending a line) or of the opponent (blocking it).
+        Parameters:
+        - move: Column index of a playable column.
+        Returns: Integer length of the longest line.
+        """
+        rays = self.spec.cell_rays[find_empty_row(self.grid, move)][move]
+        return max(longest_line(self.grid, 'R', rays), longest_line(self.grid, 'J', rays))
+
+    def key(self):
+        """
+        Returns the key of the position, usable in a transposition table.
+        Returns: Integer Zobrist hash of the grid and the player to move.
+        """
+        return self.hash
+
+    def canonical_key(self):
+        """
+        Returns a key shared by the position and its mirror image, see BitboardPosition.canonical_key.
+        Returns: Tuple (key, mirrored) where mirrored tells if the key is the key of the mirror image.
+        """
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    def mirror_move(self, move):
+        """
+        Translates a column into the mirror image of the board.
+        Parameters:
+        - move: Column index, or None.
+        Returns: Column index of the same move on the mirror image, or None.
+        """
+        return None if move is None else self.spec.cols - 1 - move
+
+    def completes_line(self, row, col, player):
+        """
+        Checks if a piece of a player dropped on an empty cell would make spec.connect consecutive pieces.
+        Parameters:
+        - row: Row index of the empty cell.
+        - col: Column index of the empty cell.
+        - player: Character of the player.
+        Returns: Boolean indicating if the piece would win.
+        """
+        return has_line(self.grid, player, self.spec.cell_rays[row][col], self.spec.connect)
+
+    def winning_moves(self):
+        """
+        Finds the moves winning immediately for the player to move.
+        Returns: List of column indices.
+        """
+        return [col for col in self.generate_moves()
+                if self.completes_line(find_empty_row(self.grid, col), col, self.current_player)]
+
+    def non_losing_moves(self):
+        """
+        Finds the moves that do not let the opponent win on the next move: the only block when the opponent
+        threatens to win, and never the cell right below a winning cell of the opponent.
+        Returns: List of column indices, empty if the opponent wins whatever is played.
+        """
+        opponent = 'R' if self.current_player == 'J' else 'J'
+        rows = {col: find_empty_row(self.grid, col) for col in self.generate_moves()}
+        threats = [col for col in rows if self.completes_line(rows[col], col, opponent)]
+        if len(threats) > 1:
+            return []  # Two threats, only one can be blocked
+        return [col for col in threats or rows
+                if rows[col] == 0 or not self.completes_line(rows[col] - 1, col, opponent)]
 
     def generate_moves(self):
         """
@@ -82,37 +197,82 @@ class Position:
         - move: Column index where the piece is to be placed.
         Returns: New Position object representing the state after the move.
         """
-        new_grid = [row[:] for row in self.grid]
-        row_insert = find_empty_row(new_grid, move)
-        new_grid[row_insert][move] = self.current_player
-        return Position(new_grid, 'R' if self.current_player == 'J' else 'J')
+        window_score = self.window_score.copy() if self.window_score is not None else None
+        child = Position(self.grid, self.current_player, self.last_move, self.evaluator, window_score, self.spec)
+        child.push(move)
+        return child
+
+    def push(self, move):
+        """
+        Plays a move in place, without creating a new Position. The move can be taken back with pop().
+        Parameters:
+        - move: Column index where the piece is to be placed.
+        """
+        row_insert = find_empty_row(self.grid, move)
+        self.history.append((row_insert, move, self.last_move, self._winner))
+        self.grid[row_insert][move] = self.current_player
+        player_keys = self.spec.zobrist_keys[self.current_player][row_insert]
+        self.hash ^= player_keys[move] ^ self.spec.zobrist_side
+        self.mirror_hash ^= player_keys[self.spec.cols - 1 - move] ^ self.spec.zobrist_side
+        if self.window_score is not None:
+            self.window_score.add(row_insert, move, self.current_player)
+        self.current_player = 'R' if self.current_player == 'J' else 'J'
+        self.last_move = (row_insert, move)
+        self.moves += 1
+        self._winner = _UNKNOWN
+
+    def pop(self):
+        """
+        Takes back the last move made with push().
+        Returns: Column index of the move taken back.
+        """
+        row_insert, move, self.last_move, self._winner = self.history.pop()
+        self.current_player = 'R' if self.current_player == 'J' else 'J'
+        self.grid[row_insert][move] = ' '
+        self.moves -= 1
+        player_keys = self.spec.zobrist_keys[self.current_player][row_insert]
+        self.hash ^= player_keys[move] ^ self.spec.zobrist_side
+        self.mirror_hash ^= player_keys[self.spec.cols - 1 - move] ^ self.spec.zobrist_side
+        if self.window_score is not None:
+            self.window_score.remove(row_insert, move, self.current_player)
+        return move
 
     def check_winner(self):
         """
-        Checks for a winner in the current game state.
+        Checks for a winner in the current game state. The result is computed once per position and cached,
+        and only the lines through the last move are inspected when it is known.
         Returns: Character of the winning player, or None if no winner.
         """
-        for row in range(len(self.grid)):
-            for col in range(len(self.grid[0])):
-                if self.grid[row][col] != ' ':
-                    # Check Horizontal
-                    if col + 3 < len(self.grid[0]):
-                        if (self.grid[row][col] == self.grid[row][col + 1] ==
-                                self.grid[row][col + 2] == self.grid[row][col + 3]):
-                            return self.grid[row][col]
-                    # Check Vertical
-                    if row + 3 < len(self.grid):
-                        if (self.grid[row][col] == self.grid[row + 1][col] ==
-                                self.grid[row + 2][col] == self.grid[row + 3][col]):
-                            return self.grid[row][col]
-                    # Check Diagonal /
-                    if col + 3 < len(self.grid[0]) and row + 3 < len(self.grid):
-                        if (self.grid[row][col] == self.grid[row + 1][col + 1] ==
-                                self.grid[row + 2][col + 2] == self.grid[row + 3][col + 3]):
-                            return self.grid[row][col]
-                    # Check Diagonal \
-                    if col - 3 >= 0 and row + 3 < len(self.grid):
-                        if (self.grid[row][col] == self.grid[row + 1][col - 1] ==
-                                self.grid[row + 2][col - 2] == self.grid[row + 3][col - 3]):
-                            return self.grid[row][col]
+        if self._winner is _UNKNOWN:
+            if self.last_move is None:
+                self._winner = self.check_winner_full()
+            else:
+                self._winner = self.check_winner_at(*self.last_move)
+        return self._winner
+
+    def check_winner_at(self, row, col):
+        """
+        Checks if the piece at a given cell is part of spec.connect consecutive pieces.
+        Parameters:
+        - row: Row index of the cell.
+        - col: Column index of the cell.
+        Returns: Character of the winning player, or None if the cell is not part of a winning line.
+        """
+        player = self.grid[row][col]
+        if player == ' ':
+            return None
+        if has_line(self.grid, player, self.spec.cell_rays[row][col], self.spec.connect):
+            return player
+        return None
+
+    def check_winner_full(self):
+        """
+        Checks for a winner by scanning every window of the board.
+        Returns: Character of the winning player, or None if no winner.
+        """
+        for window in self.spec.windows:
+            row, col = window[0]
+            player = self.grid[row][col]
+            if player != ' ' and all(self.grid[row][col] == player for row, col in window):
+                return player
         return None
@@ -0,0 +1,164 @@
+import json
+import time
+
+# -------------------------------------------------------
+# Search statistics: counters filled by the search when a collector is passed
+# -------------------------------------------------------
+
+
+class SearchStats:
+    """
+    Collects what the search does: nodes, transposition table use, beta cutoffs and time spent per root move.
+    The same collector can be passed to several searches, the counters add up.
+    """
+
+    def __init__(self):
+        """
+        Initializes empty counters.
+        """
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tt_stores = 0
+        # beta_cutoffs[i]: number of cutoffs produced by the i-th move tried in a node
+        self.beta_cutoffs = []
+        self.max_depth = 0
+        self.seconds = 0.0
+        # One entry per root move searched: column, depth, score, nodes and seconds
+        self.root_moves = []
+
+    def record_cutoff(self, move_index):
+        """
+        Counts a beta cutoff.
+        Parameters:
+        - move_index: Index of the move producing the cutoff in the ordered moves of the node.
+        """
+        while len(self.beta_cutoffs) <= move_index:
+            self.beta_cutoffs.append(0)
+        self.beta_cutoffs[move_index] += 1
+
+    def record_root_move(self, col, depth, score, nodes, seconds):
+        """
+        Records the search of one root move.
+        Parameters:
+        - col: Column of the root move.
+        - depth: Depth of the search below the move.
+        - score: Score found for the move.
+        - nodes: Nodes searched for the move.
+        - seconds: Time spent on the move.
+        """
+        self.root_moves.append({'col': col, 'depth': depth, 'score': score, 'nodes': nodes, 'seconds': seconds})
+        self.max_depth = max(self.max_depth, depth)
+        self.seconds += seconds
+
+    def merge(self, other):
+        """
+        Adds the counters of another collector, for instance one filled in a worker process.
+        Parameters:
+        - other: SearchStats to add.
+        """
+        self.nodes += other.nodes
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.tt_cutoffs += other.tt_cutoffs
+        self.tt_stores += other.tt_stores
+        for move_index, count in enumerate(other.beta_cutoffs):
+            if move_index < len(self.beta_cutoffs):
+                self.beta_cutoffs[move_index] += count
+            else:
+                self.beta_cutoffs.append(count)
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.seconds += other.seconds
+        self.root_moves.extend(other.root_moves)
+
+    @property
+    def nodes_per_second(self):
+        """
+        Returns: Nodes searched per second of search time.
+        """
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        """
+        Returns: Share of the transposition table probes that found the position.
+        """
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """
+        Returns: Share of the beta cutoffs produced by the first move tried, a measure of the move ordering.
+        """
+        total = sum(self.beta_cutoffs)
+        return self.beta_cutoffs[0] / total if total else 0.0
+
+    def to_dict(self):
+        """
+        Returns: Dictionary with the counters and the derived rates.
+        """
+        return {
+            'nodes': self.nodes,
+            'seconds': self.seconds,
+            'nodes_per_second': self.nodes_per_second,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_hit_rate': self.tt_hit_rate,
+            'tt_cutoffs': self.tt_cutoffs,
+            'tt_stores': self.tt_stores,
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate,
+            'max_depth': self.max_depth,
+            'root_moves': self.root_moves,
+        }
+
+    def to_json(self, path):
+        """
+        Writes the statistics to a JSON file.
+        Parameters:
+        - path: Path of the file to write.
+        """
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=2)
+
+    def report(self):
+        """
+        Prints a summary of the statistics.
+        """
+        print(f"Noeuds explorés : {self.nodes} ({self.nodes_per_second:.0f} noeuds/seconde)")
+        print(f"Temps de recherche : {self.seconds:.2f} secondes sur {len(self.root_moves)} coups racine")
+        print(f"Table de transposition : {self.tt_probes} consultations, {self.tt_hits} trouvées "
+              f"({self.tt_hit_rate:.1%}), {self.tt_cutoffs} coupures, {self.tt_stores} enregistrements")
+        print(f"Coupures beta par rang du coup : {self.beta_cutoffs} "
+              f"({self.first_move_cutoff_rate:.1%} sur le premier coup)")
+        print(f"Profondeur maximale : {self.max_depth}")
+
+
+class RootMoveTimer:
+    """
+    Measures the nodes and time of the search of one root move.
+    """
+
+    def __init__(self, stats):
+        """
+        Starts measuring.
+        Parameters:
+        - stats: SearchStats collector, or None to measure nothing.
+        """
+        self.stats = stats
+        if stats is not None:
+            self.nodes = stats.nodes
+            self.start = time.perf_counter()
+
+    def stop(self, col, depth, score):
+        """
+        Records the root move in the collector.
+        Parameters:
+        - col: Column of the root move.
+        - depth: Depth of the search below the move.
+        - score: Score found for the move.
+        """
+        if self.stats is not None:
+            self.stats.record_root_move(col, depth, score, self.stats.nodes - self.nodes,
+                                        time.perf_counter() - self.start)
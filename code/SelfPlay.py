@@ -0,0 +1,220 @@
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from BitboardPosition import BitboardPosition
+from BoardSpec import BoardSpec, STANDARD_SPEC
+from Engine import Engine
+from PersistentCache import init_worker, worker_cache
+from GameRecord import encode_moves, decode_moves
+from UtilsPosition import find_empty_row
+
+# -------------------------------------------------------
+# Self-play: silent AI vs AI games recorded to a file
+# -------------------------------------------------------
+# Games are played without any printing, the winner being checked on a BitboardPosition kept up
+# to date with the moves, and every game is appended to a text file as one line of tab-separated
+# fields:
+#   moves     the columns played, as a move string of GameRecord
+#   result    'R' or 'J' for the winner, '-' for a draw
+#   seconds   time spent by the 'R' engine, then by the 'J' engine
+#   seed      seed of the random generator of the game, which replays it without a persistent cache
+# The file is only ever appended to, so several runs can fill the same file.
+
+DRAW = '-'
+
+# Games played by a worker process before its records are sent back and written
+GAMES_PER_TASK = 16
+
+
+def play_game(engine_r, engine_j, spec=STANDARD_SPEC, opening_moves=0, stats=None, latencies=None):
+    """
+    Plays one game between two engines without printing anything.
+    Parameters:
+    - engine_r: Engine playing 'R', who starts.
+    - engine_j: Engine playing 'J'.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played first, so that deterministic engines play different games.
+      They are drawn from the random module, seed it to replay a game.
+    - stats: Optional SearchStats collecting the statistics of the searches of both engines.
+    - latencies: Optional dictionary of lists, by player, receiving the time of every move of each engine.
+    Returns: Tuple (moves, winner, seconds) with the list of the columns played, the winning player ('R', 'J' or None
+    for a draw) and a dictionary of the time spent by each engine.
+    """
+    engines = {'R': engine_r, 'J': engine_j}
+    seconds = {'R': 0.0, 'J': 0.0}
+    grid = spec.empty_grid()
+    position = BitboardPosition(0, 0, 0, 'R', spec=spec)
+    moves = []
+    while position.moves < spec.cells:
+        player = position.current_player
+        if len(moves) < opening_moves:
+            col = random.choice(position.generate_moves())
+        else:
+            start = time.perf_counter()
+            col = engines[player].move(grid, stats)
+            elapsed = time.perf_counter() - start
+            seconds[player] += elapsed
+            if latencies is not None:
+                latencies[player].append(elapsed)
+        grid[find_empty_row(grid, col)][col] = player
+        position.push(col)
+        moves.append(col)
+        if position.check_winner():
+            return moves, player, seconds
+    return moves, None, seconds
+
+
+def format_record(moves, winner, seconds, seed):
+    """
+    Writes a game as a line of the self-play file.
+    Parameters:
+    - moves: List of the columns played.
+    - winner: Winning player, or None for a draw.
+    - seconds: Dictionary of the time spent by each engine.
+    - seed: Seed of the game.
+    Returns: String ending with a newline.
+    """
+    return f"{encode_moves(moves)}\t{winner or DRAW}\t{seconds['R']:.4f}\t{seconds['J']:.4f}\t{seed}\n"
+
+
+def parse_record(line):
+    """
+    Reads a line of the self-play file.
+    Parameters:
+    - line: Line written by format_record.
+    Returns: Dictionary with the moves, winner, seconds and seed of the game.
+    """
+    moves, result, seconds_r, seconds_j, seed = line.rstrip('\n').split('\t')
+    return {'moves': decode_moves(moves), 'winner': None if result == DRAW else result,
+            'seconds': {'R': float(seconds_r), 'J': float(seconds_j)}, 'seed': int(seed)}
+
+
+def read_games(path):
+    """
+    Reads the games of a self-play file one at a time, without loading the whole file.
+    Parameters:
+    - path: Path of the file.
+    Returns: Iterator over the dictionaries of parse_record.
+    """
+    with open(path) as games_file:
+        for line in games_file:
+            if line.strip():
+                yield parse_record(line)
+
+
+def play_games(difficulty_r, difficulty_j, seeds, spec=STANDARD_SPEC, opening_moves=0, cache=None):
+    """
+    Plays a series of games with the same two engines, reset between games.
+    Parameters:
+    - difficulty_r: Difficulty level of the engine playing 'R'.
+    - difficulty_j: Difficulty level of the engine playing 'J'.
+    - seeds: Seeds of the games, one game per seed.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played at the start of every game.
+    - cache: Optional PersistentCache shared by the engines, written back after every game.
+    Returns: List of the records of the games, as lines of the self-play file.
+    """
+    engine_r = Engine('R', difficulty_r, spec=spec, cache=cache)
+    engine_j = Engine('J', difficulty_j, spec=spec, cache=cache)
+    records = []
+    for seed in seeds:
+        random.seed(seed)
+        engine_r.new_game()
+        engine_j.new_game()
+        moves, winner, seconds = play_game(engine_r, engine_j, spec, opening_moves)
+        if cache is not None:
+            cache.flush()
+        records.append(format_record(moves, winner, seconds, seed))
+    return records
+
+
+def play_worker_games(difficulty_r, difficulty_j, seeds, spec=STANDARD_SPEC, opening_moves=0):
+    """
+    Plays a series of games in a worker process, with the cache given to its pool by init_worker.
+    Parameters:
+    - difficulty_r: Difficulty level of the engine playing 'R'.
+    - difficulty_j: Difficulty level of the engine playing 'J'.
+    - seeds: Seeds of the games, one game per seed.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played at the start of every game.
+    Returns: List of the records of the games, as lines of the self-play file.
+    """
+    return play_games(difficulty_r, difficulty_j, seeds, spec, opening_moves, worker_cache())
+
+
+def self_play(path, difficulty_r, difficulty_j, games, workers=1, seed=None, spec=STANDARD_SPEC, opening_moves=0,
+              cache=None, progress=None):
+    """
+    Plays games and appends their records to a file as they finish.
+    Parameters:
+    - path: Path of the self-play file, created if missing.
+    - difficulty_r: Difficulty level of the engine playing 'R'.
+    - difficulty_j: Difficulty level of the engine playing 'J'.
+    - games: Number of games to play.
+    - workers: Number of processes playing games at the same time (1 plays them in this process).
+    - seed: Optional seed; game i is played with seed + i. A random one is drawn if not given.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played at the start of every game.
+    - cache: Optional PersistentCache shared by all the games.
+    - progress: Optional function called with (games played, games).
+    Returns: Dictionary with the number of games, the wins of each player, the draws and the total time.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    seeds = [seed + i for i in range(games)]
+    summary = {'games': 0, 'R': 0, 'J': 0, 'draws': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+
+    if workers <= 1:
+        batches = (play_games(difficulty_r, difficulty_j, seeds[i:i + GAMES_PER_TASK], spec, opening_moves, cache)
+                   for i in range(0, games, GAMES_PER_TASK))
+        executor = None
+    else:
+        # The cache is sent once to every worker, which warms its tables once for all its batches
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache,))
+        futures = [executor.submit(play_worker_games, difficulty_r, difficulty_j, seeds[i:i + GAMES_PER_TASK], spec,
+                                   opening_moves)
+                   for i in range(0, games, GAMES_PER_TASK)]
+        batches = (future.result() for future in as_completed(futures))
+
+    try:
+        with open(path, 'a') as games_file:
+            for records in batches:
+                games_file.write(''.join(records))
+                for record in records:
+                    result = record.split('\t', 2)[1]
+                    summary['draws' if result == DRAW else result] += 1
+                summary['games'] += len(records)
+                if progress is not None:
+                    progress(summary['games'], games)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parties IA contre IA enregistrées dans un fichier")
+    parser.add_argument('path', metavar='FICHIER', help="fichier auquel les parties sont ajoutées")
+    parser.add_argument('--games', type=int, default=100, help="nombre de parties (100 par défaut)")
+    parser.add_argument('--red', default='easy', help="niveau de l'IA du joueur Rouge (easy par défaut)")
+    parser.add_argument('--yellow', default='easy', help="niveau de l'IA du joueur Jaune (easy par défaut)")
+    parser.add_argument('--workers', type=int, default=1, help="nombre de processus (1 par défaut)")
+    parser.add_argument('--seed', type=int, help="graine de la première partie")
+    parser.add_argument('--openings', type=int, default=0, help="nombre de coups aléatoires en début de partie")
+    parser.add_argument('--rows', type=int, default=6, help="nombre de lignes de la grille (6 par défaut)")
+    parser.add_argument('--cols', type=int, default=7, help="nombre de colonnes de la grille (7 par défaut)")
+    parser.add_argument('--connect', type=int, default=4,
+                        help="nombre de pions à aligner pour gagner (4 par défaut)")
+    args = parser.parse_args()
+    try:
+        board_spec = BoardSpec.of(args.rows, args.cols, args.connect)
+    except ValueError as error:
+        parser.error(str(error))
+    result = self_play(args.path, args.red, args.yellow, args.games, args.workers, args.seed, board_spec,
+                       args.openings)
+    print(f"{result['games']} parties en {result['seconds']:.1f} secondes : {result['R']} victoires de Rouge, "
+          f"{result['J']} victoires de Jaune, {result['draws']} matchs nuls")
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+from AiMoves import DIFFICULTY_DEPTHS
+from BitboardPosition import BitboardPosition
+from BoardSpec import BoardSpec
+from GameRecord import encode_moves
+from UtilsAiMoves import make_ai_move
+from UtilsPosition import find_empty_row
+
+# -------------------------------------------------------
+# Game server: games against the AI over TCP
+# -------------------------------------------------------
+# Clients send one JSON object per line and receive one JSON object per line in return:
+#   {"type": "new_game", "difficulty": "hard", "player": "R", "time_ms": 1000}
+#       starts a game, the client playing "player" ('R' starts). The other optional fields are
+#       "evaluator", "rows", "cols" and "connect".
+#   {"type": "move", "game": 1, "column": 3}
+#       plays a move of the client, the AI answering at once if the game goes on.
+#   {"type": "state", "game": 1} and {"type": "close", "game": 1}
+# Answers to new_game, move and state give the state of the game: its grid (one string per row,
+# top row first), its moves, the player to move, the winner and whether it is over, with the move
+# of the AI in "ai_move". Refused requests get {"type": "error", "message": ...}. The "id" of a
+# request, if any, is copied into its answer.
+# The requests of a connection are handled in order, and its games end with it; a connection keeps
+# at most MAX_GAMES_PER_CONNECTION games open, and any number of connections are served at the same time. The searches of the AI run in a pool of processes, so
+# the event loop keeps serving the other connections meanwhile. Every AI move has a time budget,
+# counted from the moment a process starts its search, so a move waiting for a free process is not
+# searched less: the search deepens up to the depth of the difficulty level while the budget lasts.
+
+DEFAULT_PORT = 4000
+
+# Time budget of an AI move when the client does not give one, and the largest budget a client can ask for
+DEFAULT_TIME_MS = 1000
+MAX_TIME_MS = 5000
+
+EVALUATORS = ('classic', 'windows')
+
+# Largest number of rows or columns of a board
+MAX_SIZE = 16
+
+# Largest number of games a connection can keep open at once
+MAX_GAMES_PER_CONNECTION = 16
+
+
+class ProtocolError(Exception):
+    """
+    Request refused by the server, reported to the client as an error message.
+    """
+
+
+def search_move(grid, player, depth, evaluator, time_ms, spec):
+    """
+    Searches the move of the AI in a worker process.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - player: Character of the AI player.
+    - depth: Largest depth of the search.
+    - evaluator: Heuristic used at the leaves of the search.
+    - time_ms: Time budget of the search in milliseconds, counted from now.
+    - spec: BoardSpec of the board.
+    Returns: Column index of the move.
+    """
+    return make_ai_move(grid, player, None, evaluator=evaluator, time_ms=time_ms, spec=spec, depth=depth)
+
+
+class Game:
+    """
+    Game between a client and the AI hosted by the server.
+    """
+
+    def __init__(self, game_id, human, difficulty, time_ms, evaluator, spec):
+        """
+        Initializes an empty game.
+        Parameters:
+        - game_id: Number of the game on the server.
+        - human: Character of the player of the client.
+        - difficulty: Difficulty level of the AI, giving the largest depth of its searches.
+        - time_ms: Time budget of the AI moves in milliseconds.
+        - evaluator: Heuristic of the AI.
+        - spec: BoardSpec of the board.
+        """
+        self.game_id = game_id
+        self.human = human
+        self.ai = 'J' if human == 'R' else 'R'
+        self.difficulty = difficulty
+        self.depth = DIFFICULTY_DEPTHS[difficulty]
+        self.time_ms = time_ms
+        self.evaluator = evaluator
+        self.spec = spec
+        self.grid = spec.empty_grid()
+        self.position = BitboardPosition(0, 0, 0, 'R', spec=spec)
+        self.moves = []
+        self.winner = None
+
+    def is_over(self):
+        """
+        Returns: Boolean, True when a player has won or the board is full.
+        """
+        return self.winner is not None or len(self.moves) == self.spec.cells
+
+    def play(self, col):
+        """
+        Plays a move of the player to move.
+        Parameters:
+        - col: Column index of the move.
+        """
+        if self.is_over():
+            raise ProtocolError("La partie est terminée")
+        if not isinstance(col, int) or isinstance(col, bool) or not 0 <= col < self.spec.cols or self.grid[0][col] != ' ':
+            raise ProtocolError(f"Colonne invalide : {col}")
+        self.grid[find_empty_row(self.grid, col)][col] = self.position.current_player
+        self.position.push(col)
+        self.moves.append(col)
+        self.winner = self.position.check_winner()
+
+    def state(self):
+        """
+        Returns: Dictionary describing the game for the client.
+        """
+        return {'type': 'state', 'game': self.game_id, 'grid': [''.join(row) for row in self.grid],
+                'moves': encode_moves(self.moves), 'to_move': self.position.current_player, 'human': self.human,
+                'winner': self.winner, 'over': self.is_over()}
+
+
+class GameServer:
+    """
+    Serves games against the AI to any number of connections, the searches running in a pool of processes.
+    """
+
+    def __init__(self, workers=None, max_time_ms=MAX_TIME_MS):
+        """
+        Initializes the server and its pool of processes.
+        Parameters:
+        - workers: Number of processes searching the AI moves, the number of processors if not given.
+        - max_time_ms: Largest time budget of an AI move a client can ask for.
+        """
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.max_time_ms = max_time_ms
+        self.game_ids = itertools.count(1)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """
+        Starts listening for connections.
+        Parameters:
+        - host: Address to listen on.
+        - port: Port to listen on, 0 for any free port.
+        Returns: asyncio.Server object.
+        """
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    def close(self):
+        """
+        Stops listening and shuts the pool of processes down.
+        """
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        """
+        Answers the requests of a connection until it is closed.
+        Parameters:
+        - reader: asyncio.StreamReader of the connection.
+        - writer: asyncio.StreamWriter of the connection.
+        """
+        games = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ProtocolError("Une requête doit être un objet JSON")
+                    response = await self.handle_request(request, games)
+                except (ProtocolError, ValueError, TypeError) as error:
+                    response = {'type': 'error', 'message': str(error)}
+                if isinstance(request, dict) and 'id' in request:
+                    response['id'] = request['id']
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request, games):
+        """
+        Answers one request.
+        Parameters:
+        - request: Dictionary of the request.
+        - games: Dictionary of the games of the connection, by number.
+        Returns: Dictionary of the answer.
+        """
+        kind = request.get('type')
+        if kind == 'new_game':
+            if len(games) >= MAX_GAMES_PER_CONNECTION:
+                raise ProtocolError(f"Trop de parties ouvertes sur cette connexion (max {MAX_GAMES_PER_CONNECTION})")
+            game = self.new_game(request)
+            games[game.game_id] = game
+            ai_move = await self.ai_move(game) if game.ai == 'R' else None
+            return dict(game.state(), ai_move=ai_move)
+
+        if kind not in ('move', 'state', 'close'):
+            raise ProtocolError(f"Type de requête inconnu : {kind}")
+        game = games.get(request.get('game'))
+        if game is None:
+            raise ProtocolError(f"Partie inconnue : {request.get('game')}")
+        if kind == 'state':
+            return game.state()
+        if kind == 'close':
+            del games[game.game_id]
+            return {'type': 'closed', 'game': game.game_id}
+
+        game.play(request.get('column'))
+        ai_move = None if game.is_over() else await self.ai_move(game)
+        return dict(game.state(), ai_move=ai_move)
+
+    def new_game(self, request):
+        """
+        Creates the game asked by a new_game request.
+        Parameters:
+        - request: Dictionary of the request.
+        Returns: Game object.
+        """
+        difficulty = request.get('difficulty', 'medium')
+        if difficulty not in DIFFICULTY_DEPTHS:
+            raise ProtocolError(f"Niveau de difficulté invalide : {difficulty}, choisir parmi "
+                                f"{', '.join(DIFFICULTY_DEPTHS)}")
+        human = request.get('player', 'R')
+        if human not in ('R', 'J'):
+            raise ProtocolError(f"Joueur invalide : {human}, choisir 'R' ou 'J'")
+        evaluator = request.get('evaluator', 'classic')
+        if evaluator not in EVALUATORS:
+            raise ProtocolError(f"Évaluateur invalide : {evaluator}, choisir parmi {', '.join(EVALUATORS)}")
+        time_ms = request.get('time_ms', DEFAULT_TIME_MS)
+        if not isinstance(time_ms, (int, float)) or isinstance(time_ms, bool) or time_ms <= 0:
+            raise ProtocolError(f"Temps de réflexion invalide : {time_ms}")
+        dimensions = [request.get('rows', 6), request.get('cols', 7), request.get('connect', 4)]
+        if not all(isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_SIZE
+                   for value in dimensions):
+            raise ProtocolError(f"Dimensions invalides : {dimensions}")
+        spec = BoardSpec.of(*dimensions)
+        return Game(next(self.game_ids), human, difficulty, min(time_ms, self.max_time_ms), evaluator, spec)
+
+    async def ai_move(self, game):
+        """
+        Plays the move of the AI, searched in the pool of processes within the time budget of the game.
+        Parameters:
+        - game: Game where the AI is to move.
+        Returns: Column index of the move.
+        """
+        col = await asyncio.get_running_loop().run_in_executor(
+            self.executor, search_move, [row[:] for row in game.grid], game.ai, game.depth, game.evaluator,
+            game.time_ms, game.spec)
+        game.play(col)
+        return col
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=None, max_time_ms=MAX_TIME_MS):
+    """
+    Runs the game server until it is interrupted.
+    Parameters:
+    - host: Address to listen on.
+    - port: Port to listen on.
+    - workers: Number of processes searching the AI moves.
+    - max_time_ms: Largest time budget of an AI move a client can ask for.
+    """
+    game_server = GameServer(workers, max_time_ms)
+    server = await game_server.start(host, port)
+    print(f"Serveur en écoute sur {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de parties contre l'IA (JSON, une requête par ligne)")
+    parser.add_argument('--host', default='127.0.0.1', help="adresse d'écoute (127.0.0.1 par défaut)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port d'écoute ({DEFAULT_PORT} par défaut)")
+    parser.add_argument('--workers', type=int, help="nombre de processus de recherche (un par processeur par défaut)")
+    parser.add_argument('--max-time-ms', type=int, default=MAX_TIME_MS,
+                        help=f"temps de réflexion maximal d'un coup de l'IA ({MAX_TIME_MS} ms par défaut)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_time_ms))
+    except KeyboardInterrupt:
+        pass
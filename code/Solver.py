@@ -0,0 +1,399 @@
+import argparse
+import mmap
+import os
+import struct
+from BitboardPosition import BitboardPosition, WIDTH, HEIGHT, COLUMN_MASKS, winning_cells, playable_cells, \
+    non_losing_cells, canonical_stones
+from BoardSpec import BoardSpec, STANDARD_SPEC
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+
+# -------------------------------------------------------
+# Perfect-play solver
+# -------------------------------------------------------
+# Scores are given from the perspective of the player to move:
+# - 0 for a draw,
+# - a positive score if the player to move wins: 1 when winning with the last possible
+#   piece, one more for every piece the win comes earlier ((cells + 1 - moves at the win) // 2),
+# - a negative score if the player to move loses, with the same scale for the opponent.
+
+# -------------------------------------------------------
+# Opening book: solved positions of the first moves, stored on disk
+# -------------------------------------------------------
+# File layout: a header (magic, width, height, number of moves covered) followed by
+# records (position key, score) sorted by key, searched by bisection in a memory map.
+# A position and its mirror image have the same score and are stored once, under the
+# smallest of their keys (canonical_stones).
+# Books are only built and used for the standard board.
+
+BOOK_MAGIC = b'C4BK'
+BOOK_HEADER = struct.Struct('<4sBBBx')
+BOOK_RECORD = struct.Struct('<Qb')
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# Most empty cells of a position whose moves are solved without the opening book: the best move takes about a
+# second to find with 28 empty cells on the standard board, 20 seconds with 30 and minutes in the opening
+MAX_SOLVED_EMPTY_CELLS = 28
+
+
+class OpeningBook:
+    """
+    Read-only access to an opening book file. The file is only opened, and memory-mapped, on the first lookup,
+    so creating the book costs nothing at startup. A missing file behaves as an empty book.
+    """
+
+    def __init__(self, path=DEFAULT_BOOK_PATH):
+        """
+        Initializes the book without reading the file.
+        Parameters:
+        - path: Path of the book file.
+        """
+        self.path = path
+        self.max_moves = -1
+        self.count = 0
+        self._data = None
+        self._loaded = False
+
+    def _load(self):
+        """
+        Memory-maps the book file and checks its header.
+        """
+        self._loaded = True
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < BOOK_HEADER.size:
+            return
+        with open(self.path, 'rb') as book_file:
+            data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, width, height, max_moves = BOOK_HEADER.unpack_from(data, 0)
+        if magic != BOOK_MAGIC or (width, height) != (WIDTH, HEIGHT):
+            data.close()
+            raise ValueError(f"{self.path} n'est pas un livre d'ouvertures pour une grille {WIDTH}x{HEIGHT}")
+        self._data = data
+        self.max_moves = max_moves
+        self.count = (len(data) - BOOK_HEADER.size) // BOOK_RECORD.size
+
+    def covers(self, moves):
+        """
+        Checks if the book holds the positions with a given number of stones.
+        Parameters:
+        - moves: Number of stones on the board.
+        Returns: Boolean, False for a missing book file.
+        """
+        if not self._loaded:
+            self._load()
+        return self._data is not None and moves <= self.max_moves
+
+    def lookup(self, key, moves):
+        """
+        Looks up the exact score of a position.
+        Parameters:
+        - key: Solver key of the position, current + mask of the position or of its mirror image, whichever is
+          the smallest.
+        - moves: Number of stones on the board.
+        Returns: Score of the position for the player to move, or None if the position is not in the book.
+        """
+        if not self._loaded:
+            self._load()
+        if moves > self.max_moves or self._data is None:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, score = BOOK_RECORD.unpack_from(self._data, BOOK_HEADER.size + middle * BOOK_RECORD.size)
+            if record_key == key:
+                return score
+            if record_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+# Book shared by every solver of the process
+OPENING_BOOK = OpeningBook()
+
+# -------------------------------------------------------
+# Class Definition: Solver Class computing exact scores
+# -------------------------------------------------------
+
+
+class Solver:
+    """
+    Computes the exact score of positions with a null-window negamax search on bitboards.
+    The transposition table is kept between calls, so solving related positions gets faster.
+    """
+
+    def __init__(self, transposition_table=None, book=None, spec=STANDARD_SPEC):
+        """
+        Initializes the solver.
+        Parameters:
+        - transposition_table: Optional TranspositionTable for the exact and bound scores found.
+        - book: Optional OpeningBook, the shared default book is used if not given (on the standard board only).
+        - spec: BoardSpec of the positions to solve.
+        """
+        self.spec = spec
+        self.cells = spec.cells
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        if book is None:
+            book = OPENING_BOOK if spec == STANDARD_SPEC else OpeningBook(path='')
+        self.book = book
+        self.nodes = 0
+
+    def negamax(self, current, mask, moves, alpha, beta):
+        """
+        Searches the score of a position where the player to move cannot win immediately.
+        Parameters:
+        - current: Bitboard of the stones of the player to move.
+        - mask: Bitboard of all the stones.
+        - moves: Number of stones on the board.
+        - alpha: Lower bound of the search window.
+        - beta: Upper bound of the search window.
+        Returns: The exact score if it is inside the window, otherwise a bound on the wrong side of it.
+        """
+        self.nodes += 1
+        spec = self.spec
+        cells = self.cells
+        opponent = current ^ mask
+
+        # Moves preventing an immediate win of the opponent, and not playing under one of their winning cells
+        non_losing = non_losing_cells(current, mask, spec)
+        if not non_losing:
+            return -((cells - moves) // 2)
+
+        if moves >= cells - 2:
+            return 0  # Nobody can win with the last two pieces
+
+        lower = -((cells - 2 - moves) // 2)
+        upper = (cells - 1 - moves) // 2
+        key = current + mask
+        entry = self.transposition_table.probe(key)
+        if entry is not None:
+            _, score, flag, _ = entry
+            if flag == EXACT:
+                return score
+            elif flag == LOWER:
+                lower = max(lower, score)
+            elif flag == UPPER:
+                upper = min(upper, score)
+        if alpha < lower:
+            alpha = lower
+            if alpha >= beta:
+                return alpha
+        if beta > upper:
+            beta = upper
+            if alpha >= beta:
+                return beta
+
+        if self.book.covers(moves):
+            score = self.book.lookup(canonical_stones(current, mask, spec)[0], moves)
+            if score is not None:
+                return score
+
+        # Try first the moves creating the most winning cells, the center columns first among equals
+        candidates = []
+        for col in spec.center_order:
+            move = non_losing & spec.column_masks[col]
+            if move:
+                candidates.append((-winning_cells(current | move, mask | move, spec).bit_count(), len(candidates),
+                                   move))
+        candidates.sort()
+
+        for _, _, move in candidates:
+            score = -self.negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.transposition_table.store(key, cells - moves, score, LOWER, None)
+                return score
+            if score > alpha:
+                alpha = score
+        self.transposition_table.store(key, cells - moves, alpha, UPPER, None)
+        return alpha
+
+    def solve(self, current, mask, moves):
+        """
+        Computes the exact score of a position that is not already won, narrowing the score range with
+        null-window searches.
+        Parameters:
+        - current: Bitboard of the stones of the player to move.
+        - mask: Bitboard of all the stones.
+        - moves: Number of stones on the board.
+        Returns: Exact score of the position for the player to move.
+        """
+        spec = self.spec
+        cells = self.cells
+        if winning_cells(current, mask, spec) & playable_cells(mask, spec):
+            return (cells + 1 - moves) // 2
+        if moves == cells:
+            return 0
+
+        lower = -((cells - moves) // 2)
+        upper = (cells + 1 - moves) // 2
+        while lower < upper:
+            middle = lower + (upper - lower) // 2
+            # Probe around 0 first: most positions are close to a draw
+            if middle <= 0 and int(lower / 2) < middle:
+                middle = int(lower / 2)
+            elif middle >= 0 and int(upper / 2) > middle:
+                middle = int(upper / 2)
+            result = self.negamax(current, mask, moves, middle, middle + 1)
+            if result <= middle:
+                upper = result
+            else:
+                lower = result
+        self.transposition_table.store(current + mask, cells - moves, lower, EXACT, None)
+        return lower
+
+    def solve_position(self, position):
+        """
+        Computes the exact score of a BitboardPosition that is not already won.
+        Parameters:
+        - position: BitboardPosition to solve.
+        Returns: Exact score of the position for the player to move.
+        """
+        return self.solve(position.current, position.mask, position.moves)
+
+    def analyze(self, position):
+        """
+        Computes the exact score of every move of a position.
+        Parameters:
+        - position: BitboardPosition that is not already won.
+        Returns: Dictionary mapping each playable column to the score of the move for the player to move.
+        """
+        spec = self.spec
+        scores = {}
+        possible = playable_cells(position.mask, spec)
+        wins = winning_cells(position.current, position.mask, spec) & possible
+        for col in range(spec.cols):
+            move = possible & spec.column_masks[col]
+            if not move:
+                continue
+            if wins & move:
+                scores[col] = (self.cells + 1 - position.moves) // 2
+            else:
+                scores[col] = -self.solve(position.current ^ position.mask, position.mask | move, position.moves + 1)
+        return scores
+
+    def in_reach(self, moves):
+        """
+        Checks if the moves of a position are solved in reasonable time: the positions after them are in the
+        opening book, or few enough cells are left empty.
+        Parameters:
+        - moves: Number of stones on the board.
+        Returns: Boolean.
+        """
+        return self.cells - moves <= MAX_SOLVED_EMPTY_CELLS or self.book.covers(moves + 1)
+
+    def check_in_reach(self, moves=0):
+        """
+        Refuses to play a game whose moves are not all in reach (in_reach) from a position to the end.
+        Parameters:
+        - moves: Number of stones on the board, 0 for a whole game.
+        Raises: ValueError telling which opening book is missing and how to generate it.
+        """
+        if all(self.in_reach(count) for count in range(moves, self.cells)):
+            return
+        book_moves = self.cells - MAX_SOLVED_EMPTY_CELLS
+        if self.spec != STANDARD_SPEC:
+            raise ValueError(f"Le niveau 'perfect' ne joue sur une grille {self.spec.cols}x{self.spec.rows} "
+                             f"qu'à partir de {MAX_SOLVED_EMPTY_CELLS} cases vides, les livres "
+                             f"d'ouvertures ne couvrent que la grille {WIDTH}x{HEIGHT}")
+        raise ValueError(f"Le niveau 'perfect' a besoin d'un livre d'ouvertures de {book_moves} coups "
+                         f"({self.book.path}) : générez-le avec 'python Solver.py --build-book {book_moves}'")
+
+    def best_move(self, position):
+        """
+        Finds a move with the best exact score, the most central one among equals.
+        Parameters:
+        - position: BitboardPosition that is not already won.
+        Returns: Column index of the move, or -2 if the board is full.
+        """
+        scores = self.analyze(position)
+        if not scores:
+            return -2
+        return max(sorted(scores, key=self.spec.center_order.index), key=lambda col: scores[col])
+
+
+def player_to_move(grid):
+    """
+    Deduces the player to move from the number of pieces, 'R' always playing first.
+    Parameters:
+    - grid: 2D list representing the game board.
+    Returns: Character of the player to move.
+    """
+    red = sum(row.count('R') for row in grid)
+    yellow = sum(row.count('J') for row in grid)
+    return 'R' if red == yellow else 'J'
+
+
+def solve(grid, player=None, solver=None):
+    """
+    Computes the exact score of a grid with perfect play from both sides.
+    Parameters:
+    - grid: 2D list representing the game board, with no winner yet.
+    - player: Character of the player to move, deduced from the number of pieces if not given.
+    - solver: Optional Solver to reuse its transposition table, and giving the BoardSpec of the grid.
+      A four-in-a-row solver for the grid dimensions is used if not given.
+    Returns: Exact score for the player to move (positive: win, 0: draw, negative: loss).
+    """
+    if player is None:
+        player = player_to_move(grid)
+    if solver is None:
+        solver = Solver(spec=BoardSpec.for_grid(grid))
+    return solver.solve_position(BitboardPosition.from_grid(grid, player, spec=solver.spec))
+
+
+def build_opening_book(path, max_moves, solver=None, progress=None):
+    """
+    Solves every position reachable in at most max_moves moves and writes them as an opening book.
+    This is an offline task: solving the early positions takes a long time.
+    Parameters:
+    - path: Path of the book file to write.
+    - max_moves: Number of moves covered by the book.
+    - solver: Optional Solver used for the positions.
+    - progress: Optional function called with (positions solved, total positions).
+    Returns: Number of positions written.
+    """
+    if solver is None:
+        solver = Solver(book=OpeningBook(path=''))
+
+    # Enumerate the distinct positions that are not won and where the player to move cannot win at once
+    positions = {}
+    level = {0: (0, 0)}
+    for moves in range(max_moves + 1):
+        next_level = {}
+        for key, (current, mask) in level.items():
+            if winning_cells(current, mask) & playable_cells(mask):
+                continue
+            positions[key] = (current, mask, moves)
+            if moves == max_moves:
+                continue
+            possible = playable_cells(mask)
+            for col in range(WIDTH):
+                move = possible & COLUMN_MASKS[col]
+                if move:
+                    child_current = current ^ mask
+                    child_mask = mask | move
+                    next_level[canonical_stones(child_current, child_mask)[0]] = (child_current, child_mask)
+        level = next_level
+
+    records = []
+    for index, key in enumerate(sorted(positions)):
+        current, mask, moves = positions[key]
+        records.append(BOOK_RECORD.pack(key, solver.solve(current, mask, moves)))
+        if progress is not None:
+            progress(index + 1, len(positions))
+
+    with open(path, 'wb') as book_file:
+        book_file.write(BOOK_HEADER.pack(BOOK_MAGIC, WIDTH, HEIGHT, max_moves))
+        book_file.write(b''.join(records))
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère le livre d'ouvertures du niveau 'perfect'")
+    parser.add_argument('--build-book', type=int, required=True, metavar='COUPS',
+                        help=f"nombre de coups couverts par le livre ({STANDARD_SPEC.cells - MAX_SOLVED_EMPTY_CELLS} "
+                             f"pour que le niveau 'perfect' joue toute la partie)")
+    parser.add_argument('--book', default=DEFAULT_BOOK_PATH, metavar='FICHIER',
+                        help=f"fichier du livre ({DEFAULT_BOOK_PATH} par défaut)")
+    args = parser.parse_args()
+    count = build_opening_book(args.book, args.build_book,
+                               progress=lambda done, total: print(f"\r{done}/{total} positions résolues", end=''))
+    print(f"\nLivre d'ouvertures de {count} positions écrit dans {args.book}")
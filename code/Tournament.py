@@ -0,0 +1,344 @@
+import argparse
+import json
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from AiMoves import DIFFICULTY_DEPTHS
+from BoardSpec import BoardSpec, STANDARD_SPEC
+from Engine import Engine
+from GameRecord import encode_moves
+from SelfPlay import play_game
+from Solver import Solver
+
+# -------------------------------------------------------
+# Tournament: round robin between engine configurations
+# -------------------------------------------------------
+# Every pair of engines plays the same number of games, each opening (a few random moves, drawn
+# from the seed of the game) played twice with the colours swapped so that neither engine gets
+# the first move more often. The results give, for each engine, its wins, draws and losses, an
+# Elo rating relative to the first engine with a 95% confidence interval, and the time taken by
+# its moves.
+# Ratings are the maximum likelihood of the Bradley-Terry model, a draw counting as half a win.
+# One virtual draw is added to every pair so that an engine winning all its games still has a
+# finite rating. The intervals come from the curvature of the likelihood at the ratings found.
+
+# Options of an engine configuration, with the type of their values
+ENGINE_OPTIONS = {'difficulty': str, 'depth': int, 'time_ms': int, 'evaluator': str}
+
+# Values accepted for the options that are not numbers
+ENGINE_CHOICES = {'difficulty': (*DIFFICULTY_DEPTHS, 'perfect'), 'evaluator': ('classic', 'windows')}
+
+# Elo points for a factor e between the winning odds of two engines
+ELO_PER_NEPER = 400 / math.log(10)
+
+# Two-sided 95% quantile of the normal distribution
+CONFIDENCE_Z = 1.96
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def parse_engine(text):
+    """
+    Reads an engine configuration written as 'name:option=value,...', the name being optional. An option without
+    a value is a difficulty level, so 'hard' and 'd6:depth=6,evaluator=windows' are both configurations.
+    Parameters:
+    - text: Configuration string.
+    Returns: Dictionary with the name of the engine and its options.
+    """
+    name, separator, options = text.partition(':')
+    if not separator:
+        options = name
+    config = {'name': name}
+    for option in options.split(','):
+        key, separator, value = option.partition('=')
+        if not separator:
+            key, value = 'difficulty', option
+        if key not in ENGINE_OPTIONS:
+            raise ValueError(f"Option inconnue '{key}' dans '{text}', choisir parmi {', '.join(ENGINE_OPTIONS)}")
+        if key in ENGINE_CHOICES and value not in ENGINE_CHOICES[key]:
+            raise ValueError(f"Valeur invalide '{value}' de l'option '{key}' dans '{text}', choisir parmi "
+                             f"{', '.join(ENGINE_CHOICES[key])}")
+        config[key] = ENGINE_OPTIONS[key](value)
+    return config
+
+
+def make_engine(config, player, spec=STANDARD_SPEC):
+    """
+    Creates the engine of a configuration.
+    Parameters:
+    - config: Dictionary of parse_engine.
+    - player: Character of the player the engine plays.
+    - spec: BoardSpec of the board.
+    Returns: Engine object.
+    """
+    return Engine(player, config.get('difficulty', 'medium'), config.get('evaluator', 'classic'),
+                  config.get('time_ms'), spec=spec, depth=config.get('depth'))
+
+
+def schedule(count, games, seed):
+    """
+    Lists the games of a round robin.
+    Parameters:
+    - count: Number of engines.
+    - games: Number of games of every pair of engines, the two engines playing first in turn.
+    - seed: Seed of the first opening.
+    Returns: List of tuples (red engine index, yellow engine index, seed of the game).
+    """
+    matches = []
+    pairs = [(first, second) for first in range(count) for second in range(first + 1, count)]
+    for pair_index, (first, second) in enumerate(pairs):
+        for game in range(games):
+            # Games 2k and 2k + 1 of a pair share their opening
+            game_seed = seed + pair_index * games + game // 2
+            if game % 2 == 0:
+                matches.append((first, second, game_seed))
+            else:
+                matches.append((second, first, game_seed))
+    return matches
+
+
+def play_match_game(red, yellow, seed, spec=STANDARD_SPEC, opening_moves=2):
+    """
+    Plays one game of the tournament.
+    Parameters:
+    - red: Configuration of the engine playing 'R'.
+    - yellow: Configuration of the engine playing 'J'.
+    - seed: Seed of the random generator for the game.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played at the start of the game.
+    Returns: Tuple (moves, winner, latencies) with the columns played, the winning player or None for a draw, and
+    the time of every move of each player.
+    """
+    random.seed(seed)
+    latencies = {'R': [], 'J': []}
+    moves, winner, _ = play_game(make_engine(red, 'R', spec), make_engine(yellow, 'J', spec), spec, opening_moves,
+                                 latencies=latencies)
+    return moves, winner, latencies
+
+
+def _inverse(matrix):
+    """
+    Inverts a small square matrix with Gauss-Jordan elimination.
+    Parameters:
+    - matrix: List of rows of an invertible matrix.
+    Returns: List of rows of the inverse.
+    """
+    size = len(matrix)
+    rows = [list(row) + [1.0 if i == j else 0.0 for j in range(size)] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda row: abs(rows[row][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        factor = rows[col][col]
+        rows[col] = [value / factor for value in rows[col]]
+        for row in range(size):
+            if row != col and rows[row][col]:
+                scale = rows[row][col]
+                rows[row] = [value - scale * pivot_value for value, pivot_value in zip(rows[row], rows[col])]
+    return [row[size:] for row in rows]
+
+
+def estimate_elo(points, games, prior_draws=1, tolerance=1e-10, max_iterations=10000):
+    """
+    Estimates the Elo ratings of engines from their results against each other.
+    Parameters:
+    - points: Matrix where points[i][j] is the score of engine i against engine j (1 per win, 0.5 per draw).
+    - games: Matrix where games[i][j] is the number of games between engines i and j.
+    - prior_draws: Virtual draws added to every pair of engines that played each other.
+    - tolerance: Largest change of the log-strengths at which the iterations stop.
+    - max_iterations: Largest number of iterations.
+    Returns: Tuple (ratings, margins) of lists: the Elo rating of every engine, 0 for the first one, and the
+    half-width of its 95% confidence interval.
+    """
+    count = len(points)
+    played = [[games[i][j] + prior_draws if i != j and games[i][j] else 0 for j in range(count)]
+              for i in range(count)]
+    scores = [sum(points[i][j] + prior_draws / 2 for j in range(count) if played[i][j]) for i in range(count)]
+
+    # Minorization-maximization iterations of the Bradley-Terry model
+    strengths = [1.0] * count
+    for _ in range(max_iterations):
+        updated = []
+        for i in range(count):
+            denominator = sum(played[i][j] / (strengths[i] + strengths[j]) for j in range(count) if played[i][j])
+            updated.append(scores[i] / denominator if denominator else strengths[i])
+        updated = [strength / updated[0] for strength in updated]
+        change = max(abs(math.log(new / old)) for new, old in zip(updated, strengths))
+        strengths = updated
+        if change < tolerance:
+            break
+
+    # Observed information of the log-strengths, the first engine fixed at 0
+    information = [[0.0] * count for _ in range(count)]
+    for i in range(count):
+        for j in range(count):
+            if played[i][j]:
+                win_probability = strengths[i] / (strengths[i] + strengths[j])
+                weight = played[i][j] * win_probability * (1 - win_probability)
+                information[i][i] += weight
+                information[i][j] -= weight
+    margins = [0.0] * count
+    if count > 1:
+        covariance = _inverse([row[1:] for row in information[1:]])
+        for i in range(1, count):
+            margins[i] = CONFIDENCE_Z * ELO_PER_NEPER * math.sqrt(covariance[i - 1][i - 1])
+    ratings = [ELO_PER_NEPER * math.log(strength) for strength in strengths]
+    return ratings, margins
+
+
+def percentile(values, percent):
+    """
+    Computes a percentile with the nearest-rank method.
+    Parameters:
+    - values: Sorted list of numbers.
+    - percent: Percentile, between 0 and 100.
+    Returns: Value of the percentile, 0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def latency_summary(latencies):
+    """
+    Summarizes the times of the moves of an engine.
+    Parameters:
+    - latencies: List of move times in seconds.
+    Returns: Dictionary with the number of moves and the mean and percentiles of their time in milliseconds.
+    """
+    latencies = sorted(latencies)
+    summary = {'moves': len(latencies),
+               'mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0}
+    for percent in LATENCY_PERCENTILES:
+        summary[f'p{percent}_ms'] = 1000 * percentile(latencies, percent)
+    return summary
+
+
+def run_tournament(configs, games=10, workers=1, seed=None, spec=STANDARD_SPEC, opening_moves=2, progress=None):
+    """
+    Plays a round robin between engine configurations.
+    Parameters:
+    - configs: List of configurations of parse_engine, with different names. The 'perfect' level is refused
+      when the solver cannot play the games after the openings (Solver.check_in_reach).
+    - games: Number of games of every pair of engines, each engine playing first in half of them.
+    - workers: Number of processes playing games at the same time (1 plays them in this process).
+    - seed: Optional seed of the openings; a random one is drawn if not given.
+    - spec: BoardSpec of the board.
+    - opening_moves: Number of random moves played at the start of every game, so that the games differ.
+    - progress: Optional function called with (games played, games).
+    Returns: Dictionary of the results: one entry per engine (wins, draws, losses, Elo rating and interval, move
+    latencies), one per pair of engines, and the list of the games.
+    """
+    names = [config['name'] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Les moteurs doivent avoir des noms différents : {', '.join(names)}")
+    for config in configs:
+        if config.get('difficulty') == 'perfect' and 'time_ms' not in config and 'depth' not in config:
+            Solver(spec=spec).check_in_reach(opening_moves)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    count = len(configs)
+    matches = schedule(count, games, seed)
+
+    if workers <= 1:
+        results = ((index, play_match_game(configs[red], configs[yellow], game_seed, spec, opening_moves))
+                   for index, (red, yellow, game_seed) in enumerate(matches))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(play_match_game, configs[red], configs[yellow], game_seed, spec, opening_moves):
+                   index for index, (red, yellow, game_seed) in enumerate(matches)}
+        results = ((futures[future], future.result()) for future in as_completed(futures))
+
+    points = [[0.0] * count for _ in range(count)]
+    played = [[0] * count for _ in range(count)]
+    records = [[0, 0, 0] for _ in range(count)]  # Wins, draws and losses
+    pair_records = {(red, yellow): [0, 0, 0] for red, yellow, _ in matches if red < yellow}
+    latencies = [[] for _ in range(count)]
+    game_records = [None] * len(matches)
+    try:
+        for done, (index, (moves, winner, game_latencies)) in enumerate(results, 1):
+            red, yellow, game_seed = matches[index]
+            played[red][yellow] += 1
+            played[yellow][red] += 1
+            pair = pair_records[min(red, yellow), max(red, yellow)]
+            if winner is None:
+                points[red][yellow] += 0.5
+                points[yellow][red] += 0.5
+                records[red][1] += 1
+                records[yellow][1] += 1
+                pair[1] += 1
+            else:
+                winning, losing = (red, yellow) if winner == 'R' else (yellow, red)
+                points[winning][losing] += 1
+                records[winning][0] += 1
+                records[losing][2] += 1
+                pair[0 if winning < losing else 2] += 1
+            latencies[red].extend(game_latencies['R'])
+            latencies[yellow].extend(game_latencies['J'])
+            game_records[index] = {'red': names[red], 'yellow': names[yellow], 'winner': winner,
+                                   'moves': encode_moves(moves), 'seed': game_seed}
+            if progress is not None:
+                progress(done, len(matches))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    ratings, margins = estimate_elo(points, played)
+    engines = []
+    for i, config in enumerate(configs):
+        wins, draws, losses = records[i]
+        total = wins + draws + losses
+        engines.append({'name': names[i], 'config': {key: value for key, value in config.items() if key != 'name'},
+                        'games': total, 'wins': wins, 'draws': draws, 'losses': losses,
+                        'score': (wins + draws / 2) / total if total else 0.0,
+                        'elo': ratings[i], 'elo_low': ratings[i] - margins[i], 'elo_high': ratings[i] + margins[i],
+                        'latency': latency_summary(latencies[i])})
+    pairs = [{'engines': [names[first], names[second]], 'games': played[first][second],
+              'wins': pair[0], 'draws': pair[1], 'losses': pair[2]}
+             for (first, second), pair in pair_records.items()]
+    return {'board': [spec.rows, spec.cols, spec.connect], 'seed': seed, 'games_per_pair': games,
+            'opening_moves': opening_moves, 'engines': engines, 'pairs': pairs, 'games': game_records}
+
+
+def print_results(results):
+    """
+    Prints the table of the engines, the best rated first.
+    Parameters:
+    - results: Dictionary of run_tournament.
+    """
+    print(f"{'Moteur':<20} {'Parties':>7} {'V':>5} {'N':>5} {'D':>5} {'Elo':>7} {'IC 95%':>17} "
+          f"{'Moy. ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for engine in sorted(results['engines'], key=lambda engine: -engine['elo']):
+        latency = engine['latency']
+        interval = f"[{engine['elo_low']:.0f}, {engine['elo_high']:.0f}]"
+        print(f"{engine['name']:<20} {engine['games']:>7} {engine['wins']:>5} {engine['draws']:>5} "
+              f"{engine['losses']:>5} {engine['elo']:>7.0f} {interval:>17} {latency['mean_ms']:>9.1f} "
+              f"{latency['p50_ms']:>9.1f} {latency['p90_ms']:>9.1f} {latency['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tournoi toutes rondes entre configurations de l'IA")
+    parser.add_argument('--engine', action='append', required=True, metavar='MOTEUR',
+                        help="configuration d'un moteur, par exemple 'hard' ou 'd6:depth=6,evaluator=windows' "
+                             "(options : difficulty, depth, time_ms, evaluator), à répéter pour chaque moteur")
+    parser.add_argument('--games', type=int, default=10, help="nombre de parties par paire de moteurs (10 par défaut)")
+    parser.add_argument('--workers', type=int, default=1, help="nombre de processus (1 par défaut)")
+    parser.add_argument('--seed', type=int, help="graine de la première ouverture")
+    parser.add_argument('--openings', type=int, default=2,
+                        help="nombre de coups aléatoires en début de partie (2 par défaut)")
+    parser.add_argument('--json', metavar='FICHIER', help="écrit les résultats dans un fichier JSON")
+    parser.add_argument('--rows', type=int, default=6, help="nombre de lignes de la grille (6 par défaut)")
+    parser.add_argument('--cols', type=int, default=7, help="nombre de colonnes de la grille (7 par défaut)")
+    parser.add_argument('--connect', type=int, default=4,
+                        help="nombre de pions à aligner pour gagner (4 par défaut)")
+    args = parser.parse_args()
+    try:
+        engine_configs = [parse_engine(text) for text in args.engine]
+        board_spec = BoardSpec.of(args.rows, args.cols, args.connect)
+        tournament = run_tournament(engine_configs, args.games, args.workers, args.seed, board_spec, args.openings)
+    except ValueError as error:
+        parser.error(str(error))
+    print_results(tournament)
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(tournament, results_file, indent=2)
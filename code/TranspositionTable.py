@@ -0,0 +1,122 @@
+# -------------------------------------------------------
+# Transposition Table: fixed-size cache of search results
+# -------------------------------------------------------
+
+# Kind of score stored in an entry
+EXACT = 0  # The score is the exact value of the position
+LOWER = 1  # The search failed high: the value is at least the score
+UPPER = 2  # The search failed low: the value is at most the score
+
+# Approximate memory used by one entry (list slot, tuple and its integers)
+ENTRY_BYTES = 128
+
+# Multiplier spreading keys over the buckets (Fibonacci hashing), bitboard keys are not random in their low bits
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+
+class TranspositionTable:
+    """
+    Stores search results by position key in a fixed number of slots.
+    Every key maps to a bucket of two slots: the first one keeps the deepest result seen for the bucket,
+    the second one always receives the latest result that did not replace the first one.
+    A table kept between searches ages its entries: new_search() starts a new generation, and the results of
+    older generations give way to the new ones whatever their depth, since most of them are positions the
+    game has left behind.
+    """
+
+    def __init__(self, size_mb=16):
+        """
+        Initializes an empty table.
+        Parameters:
+        - size_mb: Memory budget of the table in megabytes.
+        """
+        # Largest power of two number of buckets fitting in the budget
+        bits = 0
+        while (4 << bits) * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            bits += 1
+        self.shift = 64 - bits
+        self.entries = [None] * (2 << bits)
+        self.generation = 0
+
+    def __len__(self):
+        """
+        Returns: Number of filled slots.
+        """
+        return sum(1 for entry in self.entries if entry is not None)
+
+    def __iter__(self):
+        """
+        Returns: Iterator over the filled slots, as tuples (key, depth, score, flag, best_move).
+        """
+        return (entry[:5] for entry in self.entries if entry is not None)
+
+    @property
+    def capacity(self):
+        """
+        Returns: Number of slots of the table.
+        """
+        return len(self.entries)
+
+    def clear(self):
+        """
+        Removes all the entries, keeping the allocated slots.
+        """
+        self.entries = [None] * len(self.entries)
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Starts a new generation: the entries stored until now become replaceable by any new result.
+        """
+        self.generation += 1
+
+    def bucket(self, key):
+        """
+        Computes the index of the first slot of the bucket of a key.
+        Parameters:
+        - key: Integer key of the position.
+        Returns: Integer index in the entries list.
+        """
+        return (((key * HASH_MULTIPLIER) & HASH_MASK) >> self.shift) << 1
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        Parameters:
+        - key: Integer key of the position.
+        Returns: Tuple (depth, score, flag, best_move) or None if the position is not stored.
+        """
+        index = self.bucket(key)
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key:
+            return entry[1:5]
+        entry = self.entries[index + 1]
+        if entry is not None and entry[0] == key:
+            return entry[1:5]
+        return None
+
+    def store(self, key, depth, score, flag, best_move):
+        """
+        Stores the result of a search. The depth-preferred slot is replaced when it is empty, holds the same
+        position, a result searched less deeply or a result of an older generation, the previous result moving
+        to the always-replace slot; otherwise the new result goes to the always-replace slot.
+        Parameters:
+        - key: Integer key of the position.
+        - depth: Depth of the search that produced the score.
+        - score: Score of the position from the perspective of the player to move.
+        - flag: EXACT, LOWER or UPPER.
+        - best_move: Best column found, or None.
+        """
+        index = self.bucket(key)
+        entry = (key, depth, score, flag, best_move, self.generation)
+        deepest = self.entries[index]
+        if deepest is None or deepest[0] == key or deepest[1] <= depth or deepest[5] != self.generation:
+            self.entries[index] = entry
+            other = self.entries[index + 1]
+            if deepest is not None and deepest[0] != key:
+                self.entries[index + 1] = deepest
+            elif other is not None and other[0] == key:
+                self.entries[index + 1] = None
+        else:
+            self.entries[index + 1] = entry
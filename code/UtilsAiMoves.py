@@ -1,47 +1,109 @@
-from AiMoves import easy_ai_move, medium_ai_move, hard_ai_move
+from AiMoves import easy_ai_move, medium_ai_move, hard_ai_move, perfect_ai_move, iterative_deepening_ai_move, \
+    fixed_depth_ai_move, DIFFICULTY_DEPTHS
+from BoardSpec import BoardSpec, STANDARD_SPEC
+from Solver import Solver
+from TranspositionTable import TranspositionTable
 
 # -----
 # AI Move Decision Functions
 # -----
 
-def get_valid_difficulty(prompt):
+def get_valid_difficulty(prompt, spec=STANDARD_SPEC):
     """
     Prompts the user to input a valid difficulty level for the game.
     Parameters:
     - prompt: String prompt displayed to the user.
+    - spec: BoardSpec of the board, 'perfect' is refused when the solver cannot play a whole game on it.
     Returns:
-    - The chosen difficulty level as a string if valid ('easy', 'medium', 'hard').
+    - The chosen difficulty level as a string if valid ('easy', 'medium', 'hard', 'perfect').
     """
     while True:
         difficulty = input(prompt)
-        if difficulty.lower() in ['easy', 'medium', 'hard']:
+        if difficulty.lower() == 'perfect':
+            try:
+                Solver(spec=spec).check_in_reach()
+            except ValueError as error:
+                print(f"Erreur : {error}.")
+                continue
+        if difficulty.lower() in ['easy', 'medium', 'hard', 'perfect']:
             return difficulty
         else:
-            print("Erreur : Niveau de difficulté invalide. Veuillez choisir parmi 'easy', 'medium' ou 'hard'.")
+            print("Erreur : Niveau de difficulté invalide. Veuillez choisir parmi 'easy', 'medium', 'hard' ou 'perfect'.")
 
 
-def make_ai_move(grid, player, difficulty, transposition_table=None):
+def search_table(difficulty, evaluator='classic', time_ms=None, cache=None, depth=None):
     """
-    Determines the AI's move based on the selected difficulty level.
+    Provides the transposition table of a search: a table of the persistent cache when one is given, only warmed
+    with results searched at most as deeply as the difficulty level, otherwise a new empty table.
+    Parameters:
+    - difficulty: String indicating the difficulty level, ignored when time_ms or depth is given.
+    - evaluator: Heuristic used at the leaves of the search.
+    - time_ms: Optional time budget of the search in milliseconds, the depth is not bounded then unless depth is given.
+    - cache: Optional PersistentCache.
+    - depth: Optional depth of the search, replacing the depth of the difficulty level.
+    Returns:
+    - TranspositionTable object.
+    """
+    if cache is not None and depth is not None:
+        return cache.table(depth, evaluator)
+    if cache is not None and time_ms is not None:
+        return cache.table(None, evaluator)
+    if cache is not None and difficulty in DIFFICULTY_DEPTHS:
+        return cache.table(DIFFICULTY_DEPTHS[difficulty], evaluator)
+    return TranspositionTable()
+
+
+def make_ai_move(grid, player, difficulty, transposition_table=None, evaluator='classic', time_ms=None, workers=1,
+                 stats=None, spec=None, cache=None, solver=None, depth=None, pool=None):
+    """
+    Determines the AI's move based on the selected difficulty level, or on a time budget.
     Parameters:
     - grid: 2D list representing the game board.
     - player: Character representing the AI player.
-    - difficulty: String indicating the difficulty level ('easy', 'medium', 'hard').
-    - transposition_table: Dictionary used to store already evaluated game states, enhancing efficiency.
+    - difficulty: String indicating the difficulty level ('easy', 'medium', 'hard', 'perfect'), ignored when time_ms
+      or depth is given.
+    - transposition_table: TranspositionTable used to store already evaluated game states, enhancing efficiency.
+    - evaluator: Heuristic used at the leaves of the search, 'classic' (longest runs) or 'windows' (window score).
+    - time_ms: Optional time budget in milliseconds. The search then deepens until the budget is spent.
+    - workers: Number of processes searching the root moves for the 'medium' and 'hard' levels.
+    - stats: Optional SearchStats collecting the nodes, transposition table use, cutoffs and time of the search.
+    - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+    - cache: Optional PersistentCache giving the transposition table when none is passed, warmed with the results
+      of the earlier games searched at most as deeply as the difficulty level. Not used by the 'perfect' level.
+    - solver: Optional Solver of the 'perfect' level, to keep its transposition table between moves. The 'perfect'
+      level raises a ValueError when the rest of the game is not in reach of the solver (Solver.check_in_reach).
+    - depth: Optional depth of the search, replacing the depth of the difficulty level. With time_ms, the search
+      deepens up to this depth at most.
+    - pool: Optional RootSearchPool searching the root moves when workers is above 1, instead of processes started
+      for this move.
     Returns:
     - Integer representing the column index for the AI's move or -2 if no valid moves are available.
     """
     if transposition_table is None:
-        transposition_table = {}
+        transposition_table = search_table(difficulty, evaluator, time_ms, cache, depth)
 
     valid_columns = [col for col in range(len(grid[0])) if grid[0][col] == ' ']
     if not valid_columns:
         return -2  # Indicates a tie or no valid moves available
 
+    if time_ms is not None:
+        max_depth = depth if depth is not None else len(grid) * len(grid[0])
+        return iterative_deepening_ai_move(player, grid, time_ms, max_depth, transposition_table, evaluator, stats,
+                                           spec)
+
+    if depth is not None:
+        return fixed_depth_ai_move(player, grid, depth, transposition_table, evaluator, workers, stats, spec, pool)
+
     # Select move based on difficulty
     if difficulty == "easy":
-        return easy_ai_move(player, grid)
+        return easy_ai_move(player, grid, transposition_table, evaluator, stats, spec)
     elif difficulty == "medium":
-        return medium_ai_move(player, grid, transposition_table)
+        return medium_ai_move(player, grid, transposition_table, evaluator, workers, stats, spec, pool)
     elif difficulty == "hard":
-        return hard_ai_move(player, grid, transposition_table)
+        return hard_ai_move(player, grid, transposition_table, evaluator, workers, stats, spec, pool)
+    elif difficulty == "perfect":
+        if solver is None:
+            solver = Solver(spec=spec if spec is not None else BoardSpec.for_grid(grid))
+        # Solving the opening without a book takes minutes: better refuse than leave the game waiting
+        solver.check_in_reach(sum(cell != ' ' for row in grid for cell in row))
+        return perfect_ai_move(player, grid, solver, stats, spec)
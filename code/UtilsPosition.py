@@ -1,7 +1,200 @@
+import random
+
 # -----
 # AI Game Handling: Helper Functions for Evaluating Game State
 # -----
 
+def build_windows(rows, cols, connect=4):
+    """
+    Lists every line of consecutive cells that can hold a winning alignment.
+    Parameters:
+    - rows: Number of rows of the board.
+    - cols: Number of columns of the board.
+    - connect: Number of aligned pieces needed to win.
+    Returns:
+    - A tuple (windows, cell_windows) where windows is a list of tuples of (row, col) cells and
+      cell_windows[row][col] is the list of the indices of the windows containing that cell.
+    """
+    windows = []
+    for row in range(rows):
+        for col in range(cols):
+            for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                end_row = row + d_row * (connect - 1)
+                end_col = col + d_col * (connect - 1)
+                if 0 <= end_row < rows and 0 <= end_col < cols:
+                    windows.append(tuple((row + d_row * i, col + d_col * i) for i in range(connect)))
+    cell_windows = [[[] for _ in range(cols)] for _ in range(rows)]
+    for index, window in enumerate(windows):
+        for row, col in window:
+            cell_windows[row][col].append(index)
+    return windows, cell_windows
+
+
+# Directions of the lines through a cell, as (row step, column step) going one way along the line
+VERTICAL = 0
+HORIZONTAL = 1
+DIAGONAL_RIGHT = 2
+DIAGONAL_LEFT = 3
+LINE_STEPS = ((-1, 0), (0, -1), (-1, 1), (-1, -1))
+
+
+def line_through(rows, cols, row, col, direction):
+    """
+    Lists the cells of the board on a line through a cell, the cell itself excluded.
+    Parameters:
+    - rows: Number of rows of the board.
+    - cols: Number of columns of the board.
+    - row: Row index of the cell.
+    - col: Column index of the cell.
+    - direction: VERTICAL, HORIZONTAL, DIAGONAL_RIGHT or DIAGONAL_LEFT.
+    Returns:
+    - A pair of tuples of (row, col) cells (rays), going away from the cell one way then the other along
+      the line: upwards first, or leftwards for the horizontal line.
+    """
+    line = []
+    for d_row, d_col in (LINE_STEPS[direction], (-LINE_STEPS[direction][0], -LINE_STEPS[direction][1])):
+        cells = []
+        r, c = row + d_row, col + d_col
+        while 0 <= r < rows and 0 <= c < cols:
+            cells.append((r, c))
+            r, c = r + d_row, c + d_col
+        line.append(tuple(cells))
+    return tuple(line)
+
+
+def build_rays(rows, cols):
+    """
+    Lists, for every cell, the cells of the four lines through it, so counting aligned pieces only reads
+    the grid without any bounds check.
+    Parameters:
+    - rows: Number of rows of the board.
+    - cols: Number of columns of the board.
+    Returns:
+    - A list where rays[row][col][direction] is the line_through() the cell in that direction.
+    """
+    return [[tuple(line_through(rows, cols, row, col, direction) for direction in range(len(LINE_STEPS)))
+             for col in range(cols)] for row in range(rows)]
+
+
+# Rays of every board size met so far, by (rows, cols)
+_RAYS = {}
+
+
+def cell_rays(rows, cols):
+    """
+    Returns the rays of a board size, building them on first use.
+    Parameters:
+    - rows: Number of rows of the board.
+    - cols: Number of columns of the board.
+    Returns:
+    - The rays of build_rays, shared by every caller.
+    """
+    rays = _RAYS.get((rows, cols))
+    if rays is None:
+        rays = _RAYS[(rows, cols)] = build_rays(rows, cols)
+    return rays
+
+
+def count_along(grid, player, line):
+    """
+    Counts consecutive pieces of a player along a line through a cell, the cell itself included.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - player: Character representing the player's pieces to count.
+    - line: Pair of rays of the line through the cell, from build_rays.
+    Returns:
+    - The count of consecutive pieces along the line.
+    """
+    count = 1
+    for ray in line:
+        for row, col in ray:
+            if grid[row][col] != player:
+                break
+            count += 1
+    return count
+
+
+def longest_line(grid, player, rays):
+    """
+    Measures the longest line of consecutive pieces of a player through a cell.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - player: Character representing the player's pieces to count.
+    - rays: The four lines through the cell, rays[row][col] from build_rays.
+    Returns:
+    - The count of consecutive pieces of the longest line, the cell itself included.
+    """
+    longest = 0
+    for line in rays:
+        count = 1
+        for ray in line:
+            for row, col in ray:
+                if grid[row][col] != player:
+                    break
+                count += 1
+        if count > longest:
+            longest = count
+    return longest
+
+
+def has_line(grid, player, rays, connect):
+    """
+    Checks if a cell is part of a line of at least connect consecutive pieces of a player, the cell itself
+    counted as one of them.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - player: Character representing the player's pieces to count.
+    - rays: The four lines through the cell, rays[row][col] from build_rays.
+    - connect: Number of aligned pieces needed.
+    Returns:
+    - Boolean indicating if such a line goes through the cell.
+    """
+    for line in rays:
+        count = 1
+        for ray in line:
+            for row, col in ray:
+                if grid[row][col] != player:
+                    break
+                count += 1
+        if count >= connect:
+            return True
+    return False
+
+
+def grid_line(grid, row, col, direction):
+    """
+    Returns the line through a cell of a grid, from the shared rays when the cell is on the grid.
+    Parameters:
+    - grid: 2D list representing the game board.
+    - row: Row index of the cell.
+    - col: Column index of the cell.
+    - direction: VERTICAL, HORIZONTAL, DIAGONAL_RIGHT or DIAGONAL_LEFT.
+    Returns:
+    - The pair of rays of the line, see line_through.
+    """
+    rows, cols = len(grid), len(grid[0])
+    if 0 <= row < rows and 0 <= col < cols:
+        return cell_rays(rows, cols)[row][col][direction]
+    return line_through(rows, cols, row, col, direction)
+
+
+def build_zobrist_keys(rows, cols, seed=2024):
+    """
+    Draws the random numbers used to hash positions (Zobrist hashing). The generator is seeded so the
+    keys are the same in every process and every run.
+    Parameters:
+    - rows: Number of rows of the board.
+    - cols: Number of columns of the board.
+    - seed: Seed of the random generator.
+    Returns:
+    - A tuple (keys, side_key) where keys[player][row][col] is the number of a piece of player at that cell
+      and side_key is the number added when 'J' is to move.
+    """
+    generator = random.Random(seed)
+    keys = {player: [[generator.getrandbits(64) for _ in range(cols)] for _ in range(rows)] for player in ('R', 'J')}
+    return keys, generator.getrandbits(64)
+
+
 def find_empty_row(grid, col):
     """
     Identifies the first empty row in a specified column from the bottom up.
@@ -28,20 +221,7 @@ def count_consecutive_horizontal(grid, player, row, col):
     Returns:
     - The count of consecutive pieces horizontally.
     """
-    count = 1
-    # Check to the left
-    for c in range(col - 1, -1, -1):
-        if grid[row][c] == player:
-            count += 1
-        else:
-            break
-    # Check to the right
-    for c in range(col + 1, len(grid[0])):
-        if grid[row][c] == player:
-            count += 1
-        else:
-            break
-    return count
+    return count_along(grid, player, grid_line(grid, row, col, HORIZONTAL))
 
 
 def count_consecutive_vertical(grid, player, row, col):
@@ -55,20 +235,7 @@ def count_consecutive_vertical(grid, player, row, col):
     Returns:
     - The count of consecutive pieces vertically.
     """
-    count = 1
-    # Check upwards
-    for r in range(row - 1, -1, -1):
-        if grid[r][col] == player:
-            count += 1
-        else:
-            break
-    # Check downwards
-    for r in range(row + 1, len(grid)):
-        if grid[r][col] == player:
-            count += 1
-        else:
-            break
-    return count
+    return count_along(grid, player, grid_line(grid, row, col, VERTICAL))
 
 
 def count_consecutive_diagonal_right(grid, player, row, col):
@@ -82,26 +249,7 @@ def count_consecutive_diagonal_right(grid, player, row, col):
     Returns:
     - The count of consecutive pieces diagonally to the right.
     """
-    count = 1
-    # Check upward-right
-    r, c = row - 1, col + 1
-    while r >= 0 and c < len(grid[0]):
-        if grid[r][c] == player:
-            count += 1
-        else:
-            break
-        r -= 1
-        c += 1
-    # Check downward-left
-    r, c = row + 1, col - 1
-    while r < len(grid) and c >= 0:
-        if grid[r][c] == player:
-            count += 1
-        else:
-            break
-        r += 1
-        c -= 1
-    return count
+    return count_along(grid, player, grid_line(grid, row, col, DIAGONAL_RIGHT))
 
 
 def count_consecutive_diagonal_left(grid, player, row, col):
@@ -115,26 +263,8 @@ def count_consecutive_diagonal_left(grid, player, row, col):
     Returns:
     - The count of consecutive pieces diagonally to the left.
     """
-    count = 1
-    # Check upward-left
-    r, c = row - 1, col - 1
-    while r >= 0 and c >= 0:
-        if grid[r][c] == player:
-            count += 1
-        else:
-            break
-        r -= 1
-        c -= 1
-    # Check downward-right
-    r, c = row + 1, col + 1
-    while r < len(grid) and c < len(grid[0]):
-        if grid[r][c] == player:
-            count += 1
-        else:
-            break
-        r += 1
-        c += 1
-    return count
+    return count_along(grid, player, grid_line(grid, row, col, DIAGONAL_LEFT))
+
 
 # -----
 #  Utils for Game Mode : Tie Detection
@@ -149,7 +279,7 @@ def tie(grid):
     - Boolean indicating whether the game is a tie (True if tie, False otherwise).
     """
     # Check each cell in the grid; if any cell is empty, the game is not a tie
-    for col in range(0, 6):
+    for col in range(len(grid[0])):
         for row in range(len(grid) - 1, -1, -1):
             if grid[row][col] == ' ':
                 return True
@@ -0,0 +1,106 @@
+from BoardSpec import BoardSpec, STANDARD_SPEC
+
+# -------------------------------------------------------
+# Window evaluation: running score updated on each move
+# -------------------------------------------------------
+# Every window of connect cells (four on the standard board) that still only holds pieces of one player is worth
+# WINDOW_WEIGHTS[number of pieces] for that player. Windows holding pieces of both
+# players can no longer be completed and are worth nothing. Unlike the classic
+# evaluation, which scores the longest run through every piece, this scoring only
+# rewards alignments that can still be won, and it can be kept up to date by looking
+# at the windows through the cell that changed. The windows and their values come from the
+# BoardSpec of the board.
+
+# Tables of the standard board
+WINDOW_WEIGHTS = STANDARD_SPEC.window_weights
+
+# WINDOW_VALUES[red][yellow]: value of a window from the perspective of 'R'
+WINDOW_VALUES = STANDARD_SPEC.window_values
+
+
+class WindowScore:
+    """
+    Keeps the number of pieces of each player in every window and the resulting score.
+    """
+
+    def __init__(self, red_counts=None, yellow_counts=None, score=0, spec=STANDARD_SPEC):
+        """
+        Initializes an empty score, or a score from existing window counts.
+        Parameters:
+        - red_counts: Optional list with the number of 'R' pieces in every window.
+        - yellow_counts: Optional list with the number of 'J' pieces in every window.
+        - score: Score matching the given counts.
+        - spec: BoardSpec of the board.
+        """
+        self.spec = spec
+        self.red_counts = red_counts if red_counts is not None else [0] * len(spec.windows)
+        self.yellow_counts = yellow_counts if yellow_counts is not None else [0] * len(spec.windows)
+        self.score = score
+
+    @classmethod
+    def from_grid(cls, grid, spec=None):
+        """
+        Builds the window counts of a grid from scratch.
+        Parameters:
+        - grid: 2D list representing the game board.
+        - spec: BoardSpec of the board, a four-in-a-row board of the grid dimensions if not given.
+        Returns: New WindowScore object for the grid.
+        """
+        window_score = cls(spec=spec if spec is not None else BoardSpec.for_grid(grid))
+        for row in range(len(grid)):
+            for col in range(len(grid[0])):
+                if grid[row][col] == 'R' or grid[row][col] == 'J':
+                    window_score.add(row, col, grid[row][col])
+        return window_score
+
+    def copy(self):
+        """
+        Returns: Independent copy of the window counts and score.
+        """
+        return WindowScore(self.red_counts[:], self.yellow_counts[:], self.score, self.spec)
+
+    def add(self, row, col, player):
+        """
+        Updates the score after a piece is dropped, looking only at the windows through its cell.
+        Parameters:
+        - row: Row index of the piece.
+        - col: Column index of the piece.
+        - player: Character of the player owning the piece.
+        """
+        red_counts = self.red_counts
+        yellow_counts = self.yellow_counts
+        window_values = self.spec.window_values
+        delta = 0
+        for index in self.spec.cell_windows[row][col]:
+            red = red_counts[index]
+            yellow = yellow_counts[index]
+            if player == 'R':
+                red_counts[index] = red + 1
+                delta += window_values[red + 1][yellow] - window_values[red][yellow]
+            else:
+                yellow_counts[index] = yellow + 1
+                delta += window_values[red][yellow + 1] - window_values[red][yellow]
+        self.score += delta
+
+    def remove(self, row, col, player):
+        """
+        Updates the score after a piece is taken back, looking only at the windows through its cell.
+        Parameters:
+        - row: Row index of the piece.
+        - col: Column index of the piece.
+        - player: Character of the player owning the piece.
+        """
+        red_counts = self.red_counts
+        yellow_counts = self.yellow_counts
+        window_values = self.spec.window_values
+        delta = 0
+        for index in self.spec.cell_windows[row][col]:
+            red = red_counts[index]
+            yellow = yellow_counts[index]
+            if player == 'R':
+                red_counts[index] = red - 1
+                delta += window_values[red - 1][yellow] - window_values[red][yellow]
+            else:
+                yellow_counts[index] = yellow - 1
+                delta += window_values[red][yellow - 1] - window_values[red][yellow]
+        self.score += delta